@@ -0,0 +1 @@
+Add a ``batch`` action that runs a list of file manager operations in one transaction, rolling all of them back if one fails.
@@ -0,0 +1,2 @@
+Add chunked, resumable uploads to the file manager (``uploadinit``, ``uploadchunk``, ``uploadstatus`` and ``uploadfinish`` modes).
+Chunks are staged in a private directory below the client home of the instance and written to the resource directory at once when the upload is finished.
@@ -0,0 +1 @@
+Add a ``format=compact`` option to ``dataTree`` that sends the tree as parallel lists of names, parent indexes, types, sizes and modification times.
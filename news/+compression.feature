@@ -0,0 +1 @@
+Compress JSON and text responses with gzip, or brotli if the ``brotli`` extra is installed, when the client accepts it. Compressed trees and listings are reused while the resource directory is unchanged.
@@ -0,0 +1 @@
+Rewrite the URLs of stylesheets saved with ``relativeUrls`` in a single pass. ``@import`` URLs are handled too, and URLs in comments and strings are left alone.
@@ -0,0 +1,2 @@
+Add ``path`` and ``depth`` parameters to the ``dataTree`` action, so the file tree can be loaded one level at a time.
+Folders that are not expanded are flagged with ``load_on_demand``. A depth below 1 is refused with a 400 Bad Request.
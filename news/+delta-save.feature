@@ -0,0 +1 @@
+Accept delta saves in ``saveFile``: a ``patch`` of splices with the content hash (``base``) of the version it was made against. Splice positions count UTF-16 code units, as JavaScript strings do. A save against a changed file is refused as a conflict.
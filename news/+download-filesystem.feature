@@ -0,0 +1 @@
+Serve downloads from filesystem resource directories as file stream iterators, so the WSGI server can send them without copying them through Python.
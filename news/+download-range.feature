@@ -0,0 +1 @@
+Stream downloads from the file manager in chunks and support ``Range`` and ``If-Range`` requests.
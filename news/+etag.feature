@@ -0,0 +1 @@
+Send an ETag with the ``dataTree``, ``filetree`` and ``getfolder`` listings of persistent resource directories, and answer ``If-None-Match`` requests for an unchanged directory with 304 Not Modified.
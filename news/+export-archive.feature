@@ -0,0 +1 @@
+Add an ``exportArchive`` action that sends a resource directory, or a folder in it, as a zip archive built one chunk at a time.
@@ -0,0 +1 @@
+Fetch a window of lines of a text file with the ``start`` and ``lines`` parameters of ``getFile``; the line index of each file version is cached, with the position of its data chunks, so that only the chunks holding the lines are loaded.
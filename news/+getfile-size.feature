@@ -0,0 +1 @@
+Detect binary files in ``getFile`` from the first few KB and send only the head of text files larger than ``maxEditSize``.
@@ -0,0 +1 @@
+Support the ``type`` parameter of ``getfolder`` (``folders``, ``images``, ``text`` or a list of extensions), filtering files while the directory is scanned.
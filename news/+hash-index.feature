@@ -0,0 +1 @@
+Add a persistent index of the content hash, size and modification time of the files of a persistent resource directory. The ``rebuildHashes`` action builds it, and the editor keeps it up to date after that. Add a ``hashes`` action that reads it.
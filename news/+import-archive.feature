@@ -0,0 +1 @@
+Add an ``importarchive`` mode to the file manager that unpacks an uploaded zip file into a folder in one request, merging with or replacing its content.
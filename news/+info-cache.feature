@@ -0,0 +1 @@
+Cache the file information shown in listings until the file is modified, and translate the size unit only once per request.
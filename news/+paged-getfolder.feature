@@ -0,0 +1 @@
+Add ``limit``, ``cursor`` and ``sort`` (``name``, ``size`` or ``mtime``) parameters to the ``getfolder`` mode, and a ``getFolder`` action with the same parameters, to page through large directories.
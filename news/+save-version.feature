@@ -0,0 +1 @@
+Return the version of text files from ``getFile`` and refuse saves made against an older version, given as ``version`` or ``If-Match``.
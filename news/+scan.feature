@@ -0,0 +1 @@
+List directories in a single pass, looking up every item only once and reusing its size and modification time, in ``getFolder``, ``dataTree`` and ``filetree``.
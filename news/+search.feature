@@ -0,0 +1 @@
+Add a ``search`` action that finds the lines of text files containing a query. The ``rebuildSearchIndex`` action builds a trigram index for it, which is kept up to date as files are saved.
@@ -0,0 +1 @@
+Encode the ``dataTree`` and ``filetree`` JSON while the resource directory is walked, instead of building the whole tree in memory first. Under WSGI the encoded response is still sent once it is complete.
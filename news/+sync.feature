@@ -0,0 +1 @@
+Add ``syncManifest`` and ``syncFiles`` actions. A deployment sends a manifest with the path, size and content hash of each file, then uploads only the files that differ.
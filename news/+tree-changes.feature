@@ -0,0 +1 @@
+Add a ``treeChanges`` action returning the changes of the tree since a given version, from a bounded change journal, or the whole tree if the version is too old.
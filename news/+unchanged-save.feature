@@ -0,0 +1 @@
+Do not write files whose content does not change when they are saved, and mark such saves as ``unchanged``.
@@ -43,7 +43,7 @@ setup(
         "Products.CMFCore",
         "Zope",
     ],
-    extras_require={"test": ["plone.app.testing"]},
+    extras_require={"brotli": ["brotli"], "test": ["plone.app.testing"]},
     entry_points="""
     """,
 )
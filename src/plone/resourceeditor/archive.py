@@ -0,0 +1,132 @@
+"""Zip archives of resource directories."""
+
+from OFS.Image import File
+from plone.resource.file import FilesystemFile
+from plone.resourceeditor.download import CHUNK_SIZE
+from plone.resourceeditor.download import iterFile
+from plone.resourceeditor.download import RangeIterator
+from plone.resourceeditor.scan import scanDirectory
+from time import localtime
+from zope.interface import implementer
+from ZPublisher.Iterators import IUnboundStreamIterator
+
+import shutil
+import tempfile
+import zipfile
+
+COMPRESSION = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+}
+
+
+class _Sink:
+    """An unseekable file collecting what a ZipFile writes, so that it can
+    be taken out piece by piece.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _dateTime(mtime):
+    if mtime is None:
+        return (1980, 1, 1, 0, 0, 0)
+    return max(localtime(mtime)[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def _iterEntries(folder, prefix=""):
+    for entry in scanDirectory(folder):
+        path = prefix + entry.name
+        yield folder, path, entry
+        if entry.isDirectory:
+            yield from _iterEntries(entry.object, path + "/")
+
+
+def iterArchive(folder, compression=zipfile.ZIP_DEFLATED):
+    """Yield a zip archive of a resource directory in pieces.
+
+    Files are read and compressed one chunk at a time, so no more than
+    about one chunk of a file is held in memory at once.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression) as archive:
+        for parent, path, entry in _iterEntries(folder):
+            if entry.isDirectory:
+                info = zipfile.ZipInfo(path + "/", _dateTime(entry.mtime))
+                archive.writestr(info, b"")
+                yield sink.take()
+                continue
+            info = zipfile.ZipInfo(path, _dateTime(entry.mtime))
+            info.compress_type = compression
+            if entry.size is not None:
+                info.file_size = entry.size
+            obj = entry.object
+            if isinstance(obj, (File, FilesystemFile)):
+                chunks = iterFile(obj)
+            else:
+                chunks = [parent.readFile(entry.name)]
+            with archive.open(info, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
+
+
+@implementer(IUnboundStreamIterator)
+class ArchiveIterator:
+    """Publish the pieces of an archive as they are made. Only for
+    directories that are not stored in the ZODB, since the iterator is
+    consumed after the request's connection has been closed.
+    """
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        for piece in self.pieces:
+            if piece:
+                return piece
+        raise StopIteration
+
+
+def spoolArchive(folder, compression=zipfile.ZIP_DEFLATED):
+    """Write a zip archive of a resource directory to a temporary file and
+    return a stream iterator over it.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+    for piece in iterArchive(folder, compression):
+        spool.write(piece)
+    size = spool.tell()
+    spool.seek(0)
+    return RangeIterator(spool, size)
+
+
+def readMember(archive, info):
+    """Return the content of a member of a zip archive: bytes if it is
+    small, or else a temporary file it has been unpacked to, so that large
+    members are never held in memory as a whole.
+    """
+    if info.file_size <= CHUNK_SIZE:
+        return archive.read(info)
+    spool = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+    with archive.open(info) as member:
+        shutil.copyfileobj(member, spool, CHUNK_SIZE)
+    spool.seek(0)
+    return spool
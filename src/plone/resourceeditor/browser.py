@@ -1,3 +1,4 @@
+from AccessControl import getSecurityManager
 from AccessControl import Unauthorized
 from DateTime import DateTime
 from OFS.Image import File
@@ -6,11 +7,57 @@ from plone.base.utils import safe_text
 from plone.resource.directory import FilesystemResourceDirectory
 from plone.resource.file import FilesystemFile
 from plone.resource.interfaces import IResourceDirectory
+from plone.resource.interfaces import IWritableResourceDirectory
+from plone.resourceeditor.archive import ArchiveIterator
+from plone.resourceeditor.archive import COMPRESSION
+from plone.resourceeditor.archive import iterArchive
+from plone.resourceeditor.archive import readMember
+from plone.resourceeditor.archive import spoolArchive
+from plone.resourceeditor.cache import directoryKey
+from plone.resourceeditor.cache import hashCache
+from plone.resourceeditor.cache import infoCache
+from plone.resourceeditor.cache import lineIndexCache
+from plone.resourceeditor.cache import modificationStamp
+from plone.resourceeditor.compression import cachedBody
+from plone.resourceeditor.compression import compressBody
+from plone.resourceeditor.compression import CompressingWriter
+from plone.resourceeditor.css import rewriteUrls
+from plone.resourceeditor.download import iterFile
+from plone.resourceeditor.download import lineOffsets
+from plone.resourceeditor.download import readHead
+from plone.resourceeditor.download import serveFile
+from plone.resourceeditor.patch import applyPatch
+from plone.resourceeditor.patch import contentHash
+from plone.resourceeditor.patch import fileHash
+from plone.resourceeditor.patch import parsePatch
+from plone.resourceeditor.patch import streamHash
+from plone.resourceeditor.scan import filtered
+from plone.resourceeditor.scan import isBinary
+from plone.resourceeditor.scan import pageDirectory
+from plone.resourceeditor.scan import scanDirectory
+from plone.resourceeditor.scan import typeFilter
+from plone.resourceeditor.search import fileText
+from plone.resourceeditor.search import searchText
+from plone.resourceeditor.state import bumpVersion
+from plone.resourceeditor.state import getChanges
+from plone.resourceeditor.state import getHash
+from plone.resourceeditor.state import getState
+from plone.resourceeditor.state import getVersionToken
+from plone.resourceeditor.state import rebuildHashIndex
+from plone.resourceeditor.state import rebuildSearchIndex
+from plone.resourceeditor.streaming import writeJSON
+from plone.resourceeditor.sync import diffManifest
+from plone.resourceeditor.sync import parseManifest
+from plone.resourceeditor.upload import appendChunk
+from plone.resourceeditor.upload import getUpload
+from plone.resourceeditor.upload import openUpload
+from plone.resourceeditor.upload import removeUpload
+from plone.resourceeditor.upload import startUpload
 from Products.CMFCore.utils import getToolByName
 from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 from time import localtime
 from time import strftime
-from urllib.parse import urlparse
+from zExceptions import BadRequest
 from zExceptions import NotFound
 from zope.cachedescriptors import property as zproperty
 from zope.component import queryMultiAdapter
@@ -19,11 +66,12 @@ from zope.i18n import translate
 from zope.i18nmessageid import MessageFactory
 from zope.publisher.browser import BrowserView
 
+import codecs
 import json
 import os.path
-import posixpath
-import re
+import transaction
 import urllib
+import zipfile
 
 _ = MessageFactory("plone")
 
@@ -34,6 +82,164 @@ def authorize(context, request):
         raise Unauthorized
 
 
+def modified(resourceDirectory, *changes):
+    """Record a change made through the editor: bump the version of the
+    resource directory, journal the given changes of its tree (see
+    recordChanges()) and drop what is cached about its files.
+
+    Files written with ``writeFile`` are journaled by an event subscriber,
+    so call filesWritten() after them instead.
+    """
+    if changes:
+        bumpVersion(resourceDirectory, changes)
+    filesWritten(resourceDirectory)
+
+
+def filesWritten(resourceDirectory):
+    """Drop what is cached about the files of a resource directory after
+    writing them with ``writeFile``, whose changes are journaled by the
+    resourceModified() subscriber. The state of the directory is created
+    if it has none yet, so that its changes are tracked from now on.
+    """
+    getState(resourceDirectory, create=True)
+    key = directoryKey(resourceDirectory)
+    infoCache.invalidate(key)
+    lineIndexCache.invalidate(key)
+    hashCache.invalidate(key)
+
+
+def notModified(context, request):
+    """Set the ETag for the current version of the resource directory and
+    compare it with the If-None-Match header of the request.
+
+    Returns True, and sets the status to 304, if the client already has the
+    current version, so that the listing does not need to be computed.
+    """
+    token = getVersionToken(context)
+    if token is None:
+        return False
+    etag = f'"{token}"'
+    request.response.setHeader("ETag", etag)
+    tags = [tag.strip() for tag in request.getHeader("If-None-Match", "").split(",")]
+    if etag in tags or f"W/{etag}" in tags or "*" in tags:
+        request.response.setStatus(304)
+        return True
+    return False
+
+
+def movedPath(path, changes):
+    """Return the path an item ends up at after the given changes (see
+    recordChanges()), or None if one of them removes it.
+    """
+    for change in changes:
+        operation, changed = change[0], change[1]
+        if path != changed and not path.startswith(changed + "/"):
+            continue
+        if operation == "remove":
+            return None
+        if operation == "rename":
+            path = change[2] + path[len(changed) :]
+    return path
+
+
+def checkDepth(depth):
+    """Raise BadRequest unless a tree depth is None or at least 1."""
+    if depth is not None and depth < 1:
+        raise BadRequest(f"Invalid depth {depth!r}")
+
+
+def versionedKey(context, *args):
+    """Return a key identifying a result computed from the current version
+    of a resource directory, or None if the version is not tracked.
+    """
+    token = getVersionToken(context)
+    if token is None:
+        return None
+    return args + (token,)
+
+
+def parseLimit(value):
+    """Parse the "limit" request parameter of paged listings."""
+    if not value:
+        return None
+    limit = int(value)
+    if limit < 1:
+        raise ValueError(f"Invalid limit {value!r}")
+    return limit
+
+
+def decodeHead(data):
+    """Decode the head of a text file, dropping a character cut in half at
+    its end.
+    """
+    try:
+        return codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+    except UnicodeDecodeError:
+        return safe_text(data)
+
+
+def patchedValue(resourceDirectory, path, patch, base):
+    """Apply a delta save to the current content of a file and return the
+    new text. Returns None if the content no longer has the hash "base" the
+    patch was made against. Raises ValueError if the patch is invalid.
+    """
+    try:
+        current = resourceDirectory.readFile(path)
+    except (AttributeError, OSError):
+        return None
+    if contentHash(current) != base:
+        return None
+    return applyPatch(safe_text(current), parsePatch(patch))
+
+
+def getFileHash(resourceDirectory, path, obj):
+    """Return the content hash of a file, which is also the token of its
+    version. Hashes are taken from the hash index of persistent directories
+    or cached per modification stamp, so files are only read if they are
+    not indexed, and then once.
+    """
+    stamp = modificationStamp(obj)
+    if stamp is None:
+        return getHash(resourceDirectory, path, obj) or fileHash(obj)
+    directory = directoryKey(resourceDirectory)
+    digest = hashCache.get(directory, (path, stamp))
+    if digest is None:
+        digest = getHash(resourceDirectory, path, obj) or fileHash(obj)
+        hashCache.set(directory, (path, stamp), digest)
+    return digest
+
+
+def isStale(resourceDirectory, path, expected):
+    """Tell whether a save made against the version "expected" of a file,
+    a bare token or the value of an If-Match header, must be refused since
+    the file has changed or does not exist.
+    """
+    try:
+        obj = resourceDirectory[path]
+    except (KeyError, NotFound):
+        return True
+    if not isinstance(obj, (File, FilesystemFile)):
+        return True
+    tags = [tag.strip() for tag in expected.split(",")]
+    if "*" in tags:
+        return False
+    version = getFileHash(resourceDirectory, path, obj)
+    return not any(tag.removeprefix("W/").strip('"') == version for tag in tags)
+
+
+def isUnchanged(resourceDirectory, path, value):
+    """Tell whether saving "value" to a file would leave it as it is. The
+    content is only hashed if the size is the same.
+    """
+    try:
+        obj = resourceDirectory[path]
+    except (KeyError, NotFound):
+        return False
+    if not isinstance(obj, File) or obj.get_size() != len(value.encode("utf-8")):
+        return False
+    return getFileHash(resourceDirectory, path, obj) == contentHash(value)
+
+
 invalidFilenameChars = frozenset(r'\/:*?"<>|')
 
 
@@ -41,14 +247,110 @@ def validateFilename(name):
     return len([n for n in name if n in invalidFilenameChars]) == 0
 
 
+def splitPath(path):
+    """Return the names of a relative path to a file or folder that may be
+    written to a resource directory, or None for dot files and Mac resource
+    forks, which are not listed. Raises ValueError if the path is invalid.
+    """
+    names = path.split("/")
+    if any(name in ("", ".", "..") for name in names):
+        raise ValueError(path)
+    if any(filtered(name) for name in names):
+        return None
+    if not all(validateFilename(name) for name in names):
+        raise ValueError(path)
+    return names
+
+
+def lookup(folder, path):
+    """Return the item at a path relative to a resource directory, or None
+    if there is none.
+    """
+    obj = folder
+    for name in path.split("/"):
+        if not IResourceDirectory.providedBy(obj) or name not in obj:
+            return None
+        obj = obj[name]
+    return obj
+
+
+def makeParents(resourceDirectory, path):
+    """Create the missing folders above a file path before it is written,
+    and journal them. ``writeFile`` would create them silently, so only
+    the file would be journaled.
+    """
+    names = path.strip("/").split("/")[:-1]
+    added = []
+    for i in range(len(names)):
+        folder = "/".join(names[: i + 1])
+        if added or lookup(resourceDirectory, folder) is None:
+            added.append(folder)
+    if added:
+        resourceDirectory.makeDirectory(added[-1])
+        modified(resourceDirectory, *(("add", "/" + folder) for folder in added))
+
+
+def archiveEntries(archive):
+    """Return the folders and the files of a zip archive to import, as
+    sorted lists of paths and lists of (path, ZipInfo) tuples. Dot files
+    and Mac resource forks are skipped. Raises ValueError with the name of
+    the first entry that cannot be imported.
+    """
+    folders = set()
+    files = []
+    for info in archive.infolist():
+        path = info.filename[:-1] if info.is_dir() else info.filename
+        try:
+            names = splitPath(path)
+        except ValueError:
+            raise ValueError(info.filename)
+        if names is None:
+            continue
+        if not info.is_dir():
+            files.append((path, info))
+            names = names[:-1]
+        for i in range(len(names)):
+            folders.add("/".join(names[: i + 1]))
+    for path, info in files:
+        if path in folders:
+            raise ValueError(info.filename)
+    return sorted(folders), files
+
+
 class FileManagerActions(BrowserView):
     imageExtensions = ["png", "gif", "jpg", "jpeg", "ico"]
+    # Text files larger than this are only sent up to here, in bytes
+    maxEditSize = 1 << 20
+    # Number of bytes read to tell binary files from text
+    sniffSize = 8192
+    # Level of the compression of responses, None for the default
+    compressionLevel = None
+    # Number of search results returned unless a limit is given
+    searchLimit = 100
+    batchActions = ("saveFile", "addFolder", "addFile", "renameFile", "delete", "move")
     previewTemplate = ViewPageTemplateFile("preview.pt")
 
     @zproperty.Lazy
     def resourceDirectory(self):
         return self.context
 
+    @zproperty.Lazy
+    def directoryKey(self):
+        return directoryKey(self.resourceDirectory)
+
+    @zproperty.Lazy
+    def _sizeUnits(self):
+        return {}
+
+    def sizeUnit(self, specifier):
+        """Return the translated unit ("kb" or "mb") for file sizes."""
+        if specifier not in self._sizeUnits:
+            self._sizeUnits[specifier] = translate(
+                _(f"filemanager_{specifier}", default=specifier),
+                context=self.request,
+            )
+        return self._sizeUnits[specifier]
+
     def getObject(self, path):
         path = self.normalizePath(path)
         if not path:
@@ -65,7 +367,7 @@ class FileManagerActions(BrowserView):
         ext = ext[1:].lower()
         return ext
 
-    def getFolder(self, path):
+    def getFolder(self, path, limit=None, cursor=None, sort=None, filterType=None):
         """Returns a dict of file and folder objects representing the
         contents of the given directory (indicated by a "path" parameter). The
         values are dicts as returned by getInfo().
@@ -78,50 +380,159 @@ class FileManagerActions(BrowserView):
         files (depending on the connector). If a "type" parameter is given for
         the HTML document, the same parameter value is reused and passed
         to getFolder(). This can be used for example to only show image files
-        in a file system tree.
+        in a file system tree. It is passed as "filterType" and accepts
+        "folders", "images", "text" or a comma separated list of extensions;
+        files are filtered while the directory is scanned.
+
+        To page through large directories, pass "limit" and then the
+        "cursor" returned with each page to get the next one. The result is
+        then a dict with the "items" of the page and the "cursor" of the
+        next page (None after the last one). "sort" orders the items by
+        "name", "size" or "mtime", folders still before files. An invalid
+        limit, cursor or sort order raises ValueError.
         """
-        folders = []
-        files = []
-
         path = self.normalizePath(path)
         folder = self.getObject(path)
 
-        for name in folder.listDirectory():
-            if IResourceDirectory.providedBy(folder[name]):
-                folders.append(self.getInfo(folder[name], path=f"/{path}/{name}/"))
+        def getInfo(entry):
+            if entry.isDirectory:
+                itemPath = f"/{path}/{entry.name}/"
             else:
-                files.append(self.getInfo(folder[name], path=f"/{path}/{name}"))
-        return folders + files
+                itemPath = f"/{path}/{entry.name}"
+            return self.getInfo(entry.object, path=itemPath, entry=entry)
+
+        accept = typeFilter(filterType)
+        if limit is None and cursor is None and sort is None:
+            folders = []
+            files = []
+            for entry in scanDirectory(folder, accept=accept):
+                if entry.isDirectory:
+                    folders.append(getInfo(entry))
+                else:
+                    files.append(getInfo(entry))
+            return folders + files
+
+        entries, nextCursor = pageDirectory(
+            folder, limit, cursor, sort or "name", accept
+        )
+        items = [getInfo(entry) for entry in entries]
+        if limit is None and cursor is None:
+            return items
+        return {"items": items, "cursor": nextCursor}
 
     def getFile(self, path):
+        """Return the contents of a text file for editing, or the preview of
+        an image or binary file.
+
+        Only the first "sniffSize" bytes are read to tell binary files from
+        text. Of text files larger than "maxEditSize" bytes only the head is
+        returned, with "truncated" set and the total "size". Text files come
+        with their content "hash", also sent as ETag, which identifies the
+        version that delta saves and conflict checks of saveFile() refer to.
+        """
         path = self.normalizePath(path)
         ext = self.getExtension(path=path)
         result = {"ext": ext}
         self.request.response.setHeader("Content-Type", "application/json")
 
         if ext in self.imageExtensions:
+            return self.getPreview(path, result)
+
+        try:
             obj = self.getObject(path)
-            info = self.getInfo(obj)
-            info["preview"] = path
-            result["info"] = self.previewTemplate(info=info)
-            return json.dumps(result)
-        else:
+        except KeyError:
+            raise NotFound(path)
+        head = readHead(obj, self.sniffSize)
+        if head is None:
             try:
-                data = self.context.readFile(path)
-
-                result["contents"] = safe_text(data)
-                try:
-                    return json.dumps(result)
-                except UnicodeDecodeError:
-                    # The file we're trying to get isn't unicode encodable
-                    # so we just return the file information, not the content
-                    del result["contents"]
-                    obj = self.getObject(path)
-                    info = self.getInfo(obj)
-                    result["info"] = self.previewTemplate(info=info)
-                    return json.dumps(result)
+                result["contents"] = safe_text(self.context.readFile(path))
             except AttributeError:
                 return None
+            return json.dumps(result)
+
+        data, size = head
+        if isBinary(data):
+            return self.getPreview(path, result, obj)
+        if size > len(data):
+            data, size = readHead(obj, self.maxEditSize)
+        data = data[: self.maxEditSize]
+        if size > len(data):
+            # Cut at the last complete line
+            end = data.rfind(b"\n") + 1
+            if end:
+                data = data[:end]
+            result["contents"] = decodeHead(data)
+            result["truncated"] = True
+            result["size"] = size
+            result["hash"] = getFileHash(self.context, path, obj)
+        else:
+            result["contents"] = safe_text(data)
+            result["hash"] = contentHash(data)
+        self.request.response.setHeader("ETag", f'"{result["hash"]}"')
+        return json.dumps(result)
+
+    def getLines(self, path, start=0, count=None, index=False):
+        """Return "count" lines (all if None) of a text file from line
+        "start" on, counting from 0, as "contents", with the number of the
+        first line returned, the total "lineCount", "size" in bytes and
+        content "hash".
+
+        With "index", the byte offsets at which the lines start are returned
+        as "offsets". Binary files get the preview, like with getFile().
+        Once the line index of the file is cached, only the requested lines
+        are decoded, and only the Pdata chunks holding them are loaded.
+        """
+        path = self.normalizePath(path)
+        result = {"ext": self.getExtension(path=path)}
+        self.request.response.setHeader("Content-Type", "application/json")
+
+        try:
+            obj = self.getObject(path)
+        except KeyError:
+            raise NotFound(path)
+        head = readHead(obj, self.sniffSize)
+        if head is None:
+            raise NotFound(path)
+        data, size = head
+        if isBinary(data):
+            return self.getPreview(path, result, obj)
+
+        offsets, chunks = self.getLineIndex(path, obj)
+        start = min(max(start, 0), len(offsets))
+        end = len(offsets) if count is None else min(start + count, len(offsets))
+        first = offsets[start] if start < len(offsets) else size
+        last = offsets[end] if end < len(offsets) else size
+        result["contents"] = safe_text(b"".join(iterFile(obj, first, last, chunks)))
+        result["start"] = start
+        result["lineCount"] = len(offsets)
+        result["size"] = size
+        result["hash"] = getFileHash(self.context, path, obj)
+        if index:
+            result["offsets"] = offsets.tolist()
+        return json.dumps(result)
+
+    def getLineIndex(self, path, obj):
+        """Return the line index of a file, with the offsets of its Pdata
+        chunks (see iterPdata()), cached per content version.
+        """
+        stamp = modificationStamp(obj)
+        if stamp is None:
+            return lineOffsets(iterFile(obj)), []
+        key = (path, stamp)
+        index = lineIndexCache.get(self.directoryKey, key)
+        if index is None:
+            chunks = []
+            index = lineOffsets(iterFile(obj, chunks=chunks)), chunks
+            lineIndexCache.set(self.directoryKey, key, index)
+        return index
+
+    def getPreview(self, path, result, obj=None):
+        if obj is None:
+            obj = self.getObject(path)
+        info = self.getInfo(obj, path=self.normalizeReturnPath(path))
+        info["preview"] = path
+        result["info"] = self.previewTemplate(info=info)
+        return json.dumps(result)
 
     def normalizePath(self, path):
         if path.startswith("/"):
@@ -140,13 +551,31 @@ class FileManagerActions(BrowserView):
     def parentPath(self, path):
         return "/".join(path.split("/")[:-1])
 
-    def getInfo(self, obj, path="/"):
+    def getInfo(self, obj, path="/", entry=None):
         """Returns information about a single file. Requests
         with mode "getinfo" will include an additional parameter, "path",
         indicating which file to inspect. A boolean parameter "getsize"
         indicates whether the dimensions of the file (if an image) should be
         returned.
+
+        If the file was found by scanDirectory(), its DirectoryEntry can be
+        passed as "entry" to reuse the size and modification time.
+
+        The result is cached as long as the file is not modified.
         """
+        stamp = modificationStamp(obj, entry)
+        if stamp is not None:
+            cacheKey = (
+                self.__class__.__name__,
+                path,
+                obj.__name__,
+                stamp,
+                self.request.get("LANGUAGE"),
+            )
+            info = infoCache.get(self.directoryKey, cacheKey)
+            if info is not None:
+                return info
+
         filename = obj.__name__
 
         properties = {
@@ -156,8 +585,12 @@ class FileManagerActions(BrowserView):
         size = 0
 
         if isinstance(obj, File):
-            properties["dateModified"] = DateTime(obj._p_mtime).strftime("%c")
-            size = obj.get_size() / 1024
+            if entry is None:
+                properties["dateModified"] = DateTime(obj._p_mtime).strftime("%c")
+                size = obj.get_size() / 1024
+            else:
+                properties["dateModified"] = DateTime(entry.mtime).strftime("%c")
+                size = entry.size / 1024
 
         if IResourceDirectory.providedBy(obj):
             fileType = "dir"
@@ -166,29 +599,26 @@ class FileManagerActions(BrowserView):
             fileType = self.getExtension(obj)
             is_folder = False
         if isinstance(obj, FilesystemFile):
-            stats = os.stat(obj.path)
-            modified = localtime(stats.st_mtime)
-            properties["dateModified"] = strftime("%c", modified)
-            size = stats.st_size / 1024
+            if entry is None:
+                stats = os.stat(obj.path)
+                mtime, size = stats.st_mtime, stats.st_size
+            else:
+                mtime, size = entry.mtime, entry.size
+            properties["dateModified"] = strftime("%c", localtime(mtime))
+            size = size / 1024
 
         if size < 1024:
             size_specifier = "kb"
         else:
             size_specifier = "mb"
             size = size / 1024
-        properties["size"] = "{}{}".format(
-            size,
-            translate(
-                _(f"filemanager_{size_specifier}", default=size_specifier),
-                context=self.request,
-            ),
-        )
+        properties["size"] = f"{size}{self.sizeUnit(size_specifier)}"
 
         if isinstance(obj, Image):
             properties["height"] = obj.height
             properties["width"] = obj.width
 
-        return {
+        info = {
             "filename": filename,
             "label": filename,
             "fileType": fileType,
@@ -197,42 +627,88 @@ class FileManagerActions(BrowserView):
             "path": path,
             "folder": is_folder,
         }
-
-    def saveFile(self, path, value):
+        if stamp is not None:
+            infoCache.set(self.directoryKey, cacheKey, info)
+        return info
+
+    def saveFile(self, path, value, patch=None, base=None, version=None):
+        """Save a text file. Instead of the whole "value", a "patch" of
+        splices (see applyPatch()) can be sent with the content hash "base"
+        of the version it was made against; if the file has changed since,
+        nothing is saved and the result is a conflict.
+
+        Likewise, if the "version" (the "hash" returned by getFile(), or an
+        If-Match header) is given, the save is refused as a conflict before
+        anything is written unless the file is still at that version.
+
+        Saving the content the file already has does not write anything;
+        the result is then marked "unchanged".
+        """
         path = path.lstrip("/")
-        value = value.strip().replace("\r\n", "\n")
+        self.request.response.setHeader("Content-Type", "application/json")
 
         if path in self.context:
             if IResourceDirectory.providedBy(self.context[path]):
                 return json.dumps({"error": "invalid path"})
 
-        if "relativeUrls" in self.request.form:
-            reg = re.compile(r"url\(([^)]+)\)")
-            urls = reg.findall(value)
+        if version and isStale(self.context, path, version):
+            return self.saveConflict()
+
+        if patch is not None:
+            try:
+                value = patchedValue(self.context, path, patch, base)
+            except ValueError:
+                return json.dumps(
+                    {
+                        "error": translate(
+                            _(
+                                "filemanager_invalid_request",
+                                default="Invalid request.",
+                            ),
+                            context=self.request,
+                        ),
+                        "code": 1,
+                    }
+                )
+            if value is None:
+                return self.saveConflict()
+        value = value.strip().replace("\r\n", "\n")
 
+        if "relativeUrls" in self.request.form:
             # Trim off the @@plone.resourceeditor bit to just give us the
             # theme url
             limit = self.request.URL.find("@@plone.resourceeditor")
-            location = self.request.URL[0:limit]
-            base = urlparse(location)
-            for url in urls:
-                asset = urlparse(url.strip("'").strip('"'))
-                if base.netloc != asset.netloc:
-                    continue
+            value = rewriteUrls(value, self.request.URL[0:limit])
 
-                base_dir = "." + posixpath.dirname(base.path)
-                target = "." + asset.path
-                out = posixpath.relpath(target, start=base_dir)
-                value = value.replace(url.strip('"').strip("'"), out)
-
-        self.request.response.setHeader("Content-Type", "application/json")
         if isinstance(self.context, FilesystemResourceDirectory):
             # we cannot save in an FS directory, but we return the file content
             # (useful when we compile less from the theming editor)
             return json.dumps({"success": "tmp", "value": value})
+        elif isUnchanged(self.context, path, value):
+            # Do not store a new copy of the same content
+            return json.dumps(
+                {"success": "save", "hash": contentHash(value), "unchanged": True}
+            )
         else:
+            makeParents(self.context, path)
             self.context.writeFile(path, value)
-            return json.dumps({"success": "save"})
+            filesWritten(self.context)
+            return json.dumps({"success": "save", "hash": contentHash(value)})
+
+    def saveConflict(self):
+        return json.dumps(
+            {
+                "error": translate(
+                    _(
+                        "filemanager_save_conflict",
+                        default="The file has been changed since it was opened.",
+                    ),
+                    context=self.request,
+                ),
+                "code": 1,
+                "conflict": True,
+            }
+        )
 
     def addFolder(self, path, name):
         """Create a new directory on the server within the given path."""
@@ -278,6 +754,11 @@ class FileManagerActions(BrowserView):
                         context=self.request,
                     )
                     code = 1
+                else:
+                    modified(
+                        self.resourceDirectory,
+                        ("add", self.normalizeReturnPath(f"{parentPath}/{name}")),
+                    )
 
         self.request.response.setHeader("Content-Type", "application/json")
         return json.dumps(
@@ -320,6 +801,7 @@ class FileManagerActions(BrowserView):
                 code = 1
             else:
                 self.resourceDirectory.writeFile(newPath, b"")
+                filesWritten(self.resourceDirectory)
 
         self.request.response.setHeader("Content-Type", "application/json")
         return json.dumps(
@@ -357,6 +839,8 @@ class FileManagerActions(BrowserView):
                     context=self.request,
                 )
                 code = 1
+            else:
+                modified(self.resourceDirectory, ("remove", "/" + npath))
 
         self.request.response.setHeader("Content-Type", "application/json")
         return json.dumps(
@@ -397,6 +881,14 @@ class FileManagerActions(BrowserView):
                     code = 1
                 else:
                     parent.rename(oldName, newName)
+                    modified(
+                        self.resourceDirectory,
+                        (
+                            "rename",
+                            "/" + npath,
+                            self.normalizeReturnPath(f"{oldPath}/{newName}"),
+                        ),
+                    )
 
         self.request.response.setHeader("Content-Type", "application/json")
         return json.dumps(
@@ -473,6 +965,10 @@ class FileManagerActions(BrowserView):
             obj = parent[filename]
             del parent[filename]
             target[filename] = obj
+            modified(
+                self.resourceDirectory,
+                ("rename", "/" + npath, self.normalizeReturnPath(newCanonicalPath)),
+            )
 
         return json.dumps(
             {
@@ -482,68 +978,723 @@ class FileManagerActions(BrowserView):
             }
         )
 
-    def do_action(self, action):
-        if action == "dataTree":
+    def iterDataTree(self, path="", depth=None):
+        """Yields the items below the given path. The children of folders
+        are generators, so the tree is only walked while it is consumed,
+        e.g. by ``streaming.iterencode``.
 
-            def getDirectory(folder, relpath=""):
-                items = []
-                for name in folder.listDirectory():
-                    obj = folder[name]
-                    path = relpath + "/" + name
-                    if IResourceDirectory.providedBy(obj):
+        If "depth" is given, only that many levels of folders are expanded.
+        Folders below that level are returned without their children and
+        flagged with "load_on_demand" when they are not empty, so the client
+        can fetch them later by requesting the tree for their path. A depth
+        below 1 raises BadRequest.
+        """
+        checkDepth(depth)
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+        except KeyError:
+            raise NotFound(path)
+        if not IResourceDirectory.providedBy(folder):
+            raise NotFound(path)
+
+        def getDirectory(folder, relpath="", depth=None):
+            for entry in scanDirectory(folder):
+                name, obj = entry.name, entry.object
+                path = relpath + "/" + name
+                if entry.isDirectory:
+                    item = {
+                        "label": name,
+                        "folder": True,
+                        "path": path,
+                    }
+                    if depth is not None and depth <= 1:
                         try:
-                            children = getDirectory(obj, path)
+                            hasChildren = bool(obj.listDirectory())
                         except NotFound:
-                            children = []
-                        items.append(
-                            {
-                                "label": name,
-                                "folder": True,
-                                "path": path,
-                                "children": children,
-                            }
+                            hasChildren = False
+                        item["load_on_demand"] = hasChildren
+                    else:
+                        item["children"] = getDirectory(
+                            obj, path, None if depth is None else depth - 1
                         )
+                    yield item
+                else:
+                    yield self.getInfo(obj, path, entry=entry)
+
+        return getDirectory(folder, "/" + path if path else "", depth)
+
+    def compactDataTree(self, path="", depth=None):
+        """Returns the items below the given path as parallel lists with
+        one entry per item. The items of a folder come together, after the
+        folder itself:
+
+        - "names": the names of the items,
+        - "parents": the index of the folder containing the item, or -1 for
+          the items directly below the path,
+        - "types": 0 for files, 1 for folders and 2 for folders whose
+          children were not loaded because of "depth" (see iterDataTree()),
+        - "sizes": the sizes of files in bytes, or None,
+        - "mtimes": the modification times as POSIX timestamps, or None.
+
+        The paths of the items are left to the client to build from the
+        "root" path and the names of their parents.
+        """
+        checkDepth(depth)
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+        except KeyError:
+            raise NotFound(path)
+        if not IResourceDirectory.providedBy(folder):
+            raise NotFound(path)
+
+        names = []
+        parents = []
+        types = []
+        sizes = []
+        mtimes = []
+        # Folders still to be visited, with their index and remaining depth
+        stack = [(folder, -1, depth)]
+        while stack:
+            folder, parent, depth = stack.pop()
+            folders = []
+            for entry in scanDirectory(folder):
+                index = len(names)
+                names.append(entry.name)
+                parents.append(parent)
+                sizes.append(entry.size)
+                mtimes.append(None if entry.mtime is None else int(entry.mtime))
+                if not entry.isDirectory:
+                    types.append(0)
+                elif depth is not None and depth <= 1:
+                    try:
+                        hasChildren = bool(entry.object.listDirectory())
+                    except NotFound:
+                        hasChildren = False
+                    types.append(2 if hasChildren else 1)
+                else:
+                    types.append(1)
+                    folders.append(
+                        (entry.object, index, None if depth is None else depth - 1)
+                    )
+            stack.extend(reversed(folders))
+
+        return {
+            "format": "compact",
+            "root": "/" + path if path else "",
+            "names": names,
+            "parents": parents,
+            "types": types,
+            "sizes": sizes,
+            "mtimes": mtimes,
+        }
+
+    def treeChanges(self, since):
+        """Returns the changes of the tree since the version identified by
+        the token "since", as sent in the ETag of the tree (with or without
+        its quotes), and the current "version".
+
+        "changes" is a list of ["add", path, item], ["modify", path, item],
+        ["remove", path] or ["rename", oldPath, newPath], to be applied in
+        order; items are like those of dataTree(), without the children of
+        folders. If the changes are not known, because the version is too
+        old or not tracked, "full" is set and the whole "tree" is returned
+        instead.
+        """
+        version = getVersionToken(self.context)
+        if since:
+            # The ETag itself, weak if the tree was sent compressed
+            since = since.removeprefix("W/").strip('"')
+        changes = getChanges(self.context, since)
+        if changes is None:
+            return {"version": version, "full": True, "tree": self.dataTree()}
+
+        result = []
+        # Paths added or modified since the last structural change, whose
+        # repeated modifications can be left out
+        current = set()
+        for index, change in enumerate(changes):
+            operation, path = change[0], change[1]
+            if operation not in ("add", "modify"):
+                current.clear()
+                result.append(list(change))
+                continue
+            if path in current:
+                continue
+            # The item is looked up where later renames moved it, and sent
+            # at its path at the time of the change, so that the renames
+            # that follow move it on the client too
+            finalPath = movedPath(path, changes[index + 1 :])
+            if finalPath is None:
+                # Removed again by a later change
+                continue
+            try:
+                obj = self.getObject(finalPath)
+            except KeyError:
+                # Changed without being journaled
+                return {"version": version, "full": True, "tree": self.dataTree()}
+            if IResourceDirectory.providedBy(obj):
+                item = {
+                    "label": path.split("/")[-1],
+                    "folder": True,
+                    "path": path,
+                    "load_on_demand": True,
+                }
+            else:
+                item = self.getInfo(obj, path)
+                if finalPath != path:
+                    name = path.split("/")[-1]
+                    item = dict(item, filename=name, label=name)
+            current.add(path)
+            result.append([operation, path, item])
+        return {"version": version, "full": False, "changes": result}
+
+    def syncManifest(self, path, manifest):
+        """Compare the folder at the given path with a "manifest" of the
+        files it should hold (see sync.parseManifest()).
+
+        Returns the paths of the files that are "needed", of the items to
+        "delete" and of the files that "match" already. Content hashes of
+        files are cached, so only files changed since they were last
+        compared are read.
+        """
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+            manifest = parseManifest(manifest, splitPath)
+        except (KeyError, ValueError):
+            return self.invalidRequest()
+        if not IResourceDirectory.providedBy(folder):
+            return self.invalidRequest()
+
+        needed, delete, match = diffManifest(folder, manifest, self.syncHash(path))
+        return {
+            "needed": needed,
+            "delete": delete,
+            "match": match,
+            "error": "",
+            "code": 0,
+        }
+
+    def syncFiles(self, path, manifest, files, delete=False):
+        """Make the folder at the given path hold the files of a "manifest".
+
+        "files" maps the paths of the files that syncManifest() reported as
+        needed to their content. Nothing is written unless all of them are
+        there and match their size and hash in the manifest; otherwise the
+        paths are returned as "missing" or "invalid". Items that are not in
+        the manifest are deleted if "delete" is set, and in any case when
+        they are in the way of a file of the manifest.
+        """
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+            manifest = parseManifest(manifest, splitPath)
+        except (KeyError, ValueError):
+            return self.invalidRequest()
+        if not IResourceDirectory.providedBy(
+            folder
+        ) or not IWritableResourceDirectory.providedBy(self.context):
+            return self.invalidRequest()
+
+        needed, extra, match = diffManifest(folder, manifest, self.syncHash(path))
+        missing = []
+        invalid = []
+        for name in needed:
+            data = files.get(name)
+            if data is None:
+                missing.append(name)
+            else:
+                digest, size = streamHash(data)
+                if (size, digest) != manifest[name]:
+                    invalid.append(name)
+        if missing or invalid:
+            result = self.invalidRequest()
+            result.update({"missing": missing, "invalid": invalid})
+            return result
+
+        def fullPath(name):
+            return f"{path}/{name}" if path else name
+
+        folders = set()
+        for name in needed:
+            names = name.split("/")[:-1]
+            for i in range(len(names)):
+                folders.add("/".join(names[: i + 1]))
+        if not delete:
+            extra = [name for name in extra if name in manifest or name in folders]
+        for name in extra:
+            parentName, _, itemName = name.rpartition("/")
+            parent = lookup(folder, parentName) if parentName else folder
+            del parent[itemName]
+        modified(self.context, *(("remove", "/" + fullPath(name)) for name in extra))
+
+        added = [
+            name
+            for name in sorted(folders)
+            if not IResourceDirectory.providedBy(lookup(folder, name))
+        ]
+        for name in added:
+            folder.makeDirectory(name)
+        modified(self.context, *(("add", "/" + fullPath(name)) for name in added))
+
+        for name in needed:
+            self.context.writeFile(fullPath(name), files[name])
+        filesWritten(self.context)
+
+        return {
+            "written": needed,
+            "deleted": extra,
+            "match": match,
+            "error": "",
+            "code": 0,
+        }
+
+    def hashes(self, path=""):
+        """Returns the [sha256, size, mtime] of each file below the folder at
+        the given path, by path relative to that folder.
+
+        The hashes are read from the hash index of the resource directory
+        if it has one, as "indexed" tells, for the files whose entry matches
+        their current version (see getFileHash()); other files are hashed.
+        The index is only built by rebuildHashes(), so that no request has
+        to hash every file as a side effect.
+        """
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+        except KeyError:
+            return self.invalidRequest()
+        if not IResourceDirectory.providedBy(folder):
+            return self.invalidRequest()
+
+        result = {}
+
+        def walk(folder, prefix):
+            for entry in scanDirectory(folder):
+                name = prefix + entry.name
+                if entry.isDirectory:
+                    walk(entry.object, name + "/")
+                    continue
+                digest = getFileHash(
+                    self.context, f"{path}/{name}" if path else name, entry.object
+                )
+                result[name] = [digest, entry.size, entry.mtime]
+
+        walk(folder, "")
+        state = getState(self.context)
+        indexed = state is not None and state.hashes is not None
+        return {"hashes": result, "indexed": indexed, "error": "", "code": 0}
+
+    def rebuildHashes(self):
+        """Rebuild the hash index of the resource directory from its files."""
+        if not IWritableResourceDirectory.providedBy(self.context):
+            return self.invalidRequest()
+        count = rebuildHashIndex(self.context)
+        return {"files": count, "error": "", "code": 0}
+
+    def search(self, query, path="", limit=None):
+        """Search the text files below the folder at the given path for
+        lines containing "query", ignoring case.
+
+        Returns the "results" as dicts with the "path" of the file, the
+        "line" number and a "snippet" of the line, up to "limit" of them
+        (searchLimit by default); "truncated" is set if there may be more.
+        Directories with a search index only read the files it gives as
+        candidates, as "indexed" tells. The index is built by
+        rebuildSearchIndex(), not as a side effect of a search or a change.
+        """
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+        except KeyError:
+            return self.invalidRequest()
+        if not query or not IResourceDirectory.providedBy(folder):
+            return self.invalidRequest()
+        if limit is None:
+            limit = self.searchLimit
+
+        state = getState(self.context)
+        indexed = state is not None and state.search is not None
+        if indexed:
+
+            def lookupAll(names):
+                for name in names:
+                    try:
+                        yield name, self.getObject(name)
+                    except KeyError:
+                        # A stale entry of the index
+                        continue
+
+            candidates = lookupAll(
+                state.search.candidates(query, f"{path}/" if path else "")
+            )
+        else:
+
+            def walk(folder, prefix):
+                for entry in scanDirectory(folder):
+                    name = prefix + entry.name
+                    if entry.isDirectory:
+                        yield from walk(entry.object, name + "/")
                     else:
-                        items.append(self.getInfo(obj, path))
-                return items
+                        yield name, entry.object
+
+            candidates = walk(folder, f"{path}/" if path else "")
+
+        results = []
+        for name, obj in candidates:
+            text = fileText(obj)
+            if text is None:
+                continue
+            for line, snippet in searchText(text, query, limit - len(results) + 1):
+                results.append({"path": "/" + name, "line": line, "snippet": snippet})
+            if len(results) > limit:
+                break
+        return {
+            "results": results[:limit],
+            "truncated": len(results) > limit,
+            "indexed": indexed,
+            "error": "",
+            "code": 0,
+        }
+
+    def rebuildSearchIndex(self):
+        """Rebuild the search index of the resource directory from its
+        files.
+        """
+        if not IWritableResourceDirectory.providedBy(self.context):
+            return self.invalidRequest()
+        count = rebuildSearchIndex(self.context)
+        return {"files": count, "error": "", "code": 0}
+
+    def syncHash(self, path):
+        def hashOf(name, obj):
+            return getFileHash(self.context, f"{path}/{name}" if path else name, obj)
+
+        return hashOf
+
+    def invalidRequest(self):
+        return {
+            "error": translate(
+                _("filemanager_invalid_request", default="Invalid request."),
+                context=self.request,
+            ),
+            "code": 1,
+        }
+
+    def dataTree(self, path="", depth=None):
+        """Returns the items below the given path as a nested list.
+        See iterDataTree().
+        """
+
+        def materialize(items):
+            result = []
+            for item in items:
+                if "children" in item:
+                    item["children"] = materialize(item["children"])
+                result.append(item)
+            return result
+
+        return materialize(self.iterDataTree(path, depth))
+
+    def batch(self, operations):
+        """Run a list of operations in one transaction.
+
+        Each operation is a dict with an "action", one of batchActions, and
+        the parameters that action takes as a request. The result holds the
+        responses of the operations that were run. Processing stops at the
+        first operation that fails, and the changes of all operations of the
+        batch are rolled back then.
+        """
+        self.request.response.setHeader("Content-Type", "application/json")
+        results = []
+        code = 0
+        error = ""
+        savepoint = transaction.savepoint()
+        for operation in operations:
+            action = None
+            if isinstance(operation, dict):
+                action = operation.get("action")
+            if action not in self.batchActions:
+                result = {
+                    "error": translate(
+                        _("filemanager_invalid_request", default="Invalid request."),
+                        context=self.request,
+                    ),
+                    "code": 1,
+                }
+            else:
+                try:
+                    result = json.loads(self.do_action(action, operation))
+                except (KeyError, NotFound, OSError, ValueError):
+                    result = {
+                        "error": translate(
+                            _(
+                                "filemanager_invalid_request",
+                                default="Invalid request.",
+                            ),
+                            context=self.request,
+                        ),
+                        "code": 1,
+                    }
+            results.append(result)
+            if result.get("code") or result.get("error"):
+                savepoint.rollback()
+                code = 1
+                error = result.get("error") or ""
+                break
+
+        return json.dumps({"results": results, "error": error, "code": code})
+
+    def do_action(self, action, params=None):
+        """Run an action. Its parameters are read from the request, unless
+        a mapping of "params" is given (see batch()).
+        """
+        if params is None:
+            params = self.request
 
-            return json.dumps(getDirectory(self.context))
+        if action == "batch":
+            authorize(self.context, self.request)
+            try:
+                operations = json.loads(self.request.get("operations", "[]"))
+            except ValueError:
+                operations = None
+            if not isinstance(operations, list):
+                self.request.response.setHeader("Content-Type", "application/json")
+                return json.dumps(
+                    {
+                        "results": [],
+                        "error": translate(
+                            _(
+                                "filemanager_invalid_request",
+                                default="Invalid request.",
+                            ),
+                            context=self.request,
+                        ),
+                        "code": 1,
+                    }
+                )
+            return self.batch(operations)
+
+        if action == "dataTree":
+            if notModified(self.context, self.request):
+                return ""
+            path = self.request.get("path", "")
+            depth = self.request.get("depth") or None
+            if depth is not None:
+                try:
+                    depth = int(depth)
+                except ValueError:
+                    raise BadRequest(f"Invalid depth {depth!r}")
+            compact = self.request.get("format") == "compact"
+            key = versionedKey(
+                self.context,
+                "dataTree",
+                self.request.get("LANGUAGE"),
+                path,
+                depth,
+                compact,
+            )
+            body = cachedBody(
+                self.request, self.directoryKey, key, self.compressionLevel
+            )
+            if body is not None:
+                self.request.response.setHeader("Content-Type", "application/json")
+                return body
+            if compact:
+                self.request.response.setHeader("Content-Type", "application/json")
+                return compressBody(
+                    self.request,
+                    json.dumps(self.compactDataTree(path, depth)),
+                    self.compressionLevel,
+                    directory=self.directoryKey,
+                    key=key,
+                )
+            writer = CompressingWriter(
+                self.request,
+                self.compressionLevel,
+                directory=self.directoryKey,
+                key=key,
+            )
+            writeJSON(self.request.response, self.iterDataTree(path, depth), writer)
+            writer.close()
+            return ""
+
+        if action == "treeChanges":
+            self.request.response.setHeader("Content-Type", "application/json")
+            result = self.treeChanges(self.request.get("since"))
+            return compressBody(self.request, json.dumps(result), self.compressionLevel)
+
+        if action == "getFolder":
+            if notModified(self.context, self.request):
+                return ""
+            self.request.response.setHeader("Content-Type", "application/json")
+            key = versionedKey(
+                self.context,
+                "getFolder",
+                self.request.get("LANGUAGE"),
+                *(
+                    self.request.get(name)
+                    for name in ("path", "limit", "cursor", "sort", "type")
+                ),
+            )
+            body = cachedBody(
+                self.request, self.directoryKey, key, self.compressionLevel
+            )
+            if body is not None:
+                return body
+            try:
+                result = self.getFolder(
+                    self.request.get("path", ""),
+                    limit=parseLimit(self.request.get("limit")),
+                    cursor=self.request.get("cursor") or None,
+                    sort=self.request.get("sort") or None,
+                    filterType=self.request.get("type") or None,
+                )
+            except ValueError:
+                result = {
+                    "error": translate(
+                        _("filemanager_invalid_request", default="Invalid request."),
+                        context=self.request,
+                    ),
+                    "code": 1,
+                }
+                key = None
+            return compressBody(
+                self.request,
+                json.dumps(result),
+                self.compressionLevel,
+                directory=self.directoryKey,
+                key=key,
+            )
 
         if action == "getFile":
             path = self.request.get("path", "")
-            return self.getFile(path)
+            if self.request.get("start") or self.request.get("lines"):
+                try:
+                    start = int(self.request.get("start") or 0)
+                    count = parseLimit(self.request.get("lines"))
+                except ValueError:
+                    self.request.response.setHeader("Content-Type", "application/json")
+                    return json.dumps(
+                        {
+                            "error": translate(
+                                _(
+                                    "filemanager_invalid_request",
+                                    default="Invalid request.",
+                                ),
+                                context=self.request,
+                            ),
+                            "code": 1,
+                        }
+                    )
+                result = self.getLines(
+                    path, start, count, bool(self.request.get("index"))
+                )
+            else:
+                result = self.getFile(path)
+            if result is None:
+                return None
+            return compressBody(self.request, result, self.compressionLevel)
 
         if action == "saveFile":
-            path = self.request.get("path", "")
-            data = self.request.get("data", "")
-            return self.saveFile(path, data)
+            path = params.get("path", "")
+            data = params.get("data", "")
+            version = params.get("version")
+            if params is self.request:
+                version = version or self.request.getHeader("If-Match")
+            return self.saveFile(
+                path, data, params.get("patch"), params.get("base"), version
+            )
 
         if action == "addFolder":
-            path = self.request.get("path", "")
-            name = self.request.get("name", "")
+            path = params.get("path", "")
+            name = params.get("name", "")
             return self.addFolder(path, name)
 
         if action == "addFile":
-            path = self.request.get("path", "")
-            name = self.request.get("filename", "")
+            path = params.get("path", "")
+            name = params.get("filename", "")
             return self.addFile(path, name)
 
         if action == "renameFile":
-            path = self.request.get("path", "")
-            name = self.request.get("filename", "")
+            path = params.get("path", "")
+            name = params.get("filename", "")
             return self.renameFile(path, name)
 
         if action == "delete":
-            path = self.request.get("path", "")
+            path = params.get("path", "")
             return self.delete(path)
 
         if action == "move":
-            src_path = self.request.get("source", "")
-            des_path = self.request.get("destination", "")
+            src_path = params.get("source", "")
+            des_path = params.get("destination", "")
             return self.move(src_path, des_path)
 
+        if action == "hashes":
+            if notModified(self.context, self.request):
+                return ""
+            self.request.response.setHeader("Content-Type", "application/json")
+            result = self.hashes(self.request.get("path", ""))
+            return compressBody(self.request, json.dumps(result), self.compressionLevel)
+
+        if action == "rebuildHashes":
+            authorize(self.context, self.request)
+            self.request.response.setHeader("Content-Type", "application/json")
+            return json.dumps(self.rebuildHashes())
+
+        if action == "search":
+            self.request.response.setHeader("Content-Type", "application/json")
+            try:
+                limit = parseLimit(self.request.get("limit"))
+            except ValueError:
+                result = self.invalidRequest()
+            else:
+                result = self.search(
+                    self.request.get("query", ""), self.request.get("path", ""), limit
+                )
+            return compressBody(self.request, json.dumps(result), self.compressionLevel)
+
+        if action == "rebuildSearchIndex":
+            authorize(self.context, self.request)
+            self.request.response.setHeader("Content-Type", "application/json")
+            return json.dumps(self.rebuildSearchIndex())
+
+        if action == "syncManifest":
+            self.request.response.setHeader("Content-Type", "application/json")
+            result = self.syncManifest(
+                self.request.get("path", ""), self.request.get("manifest", "")
+            )
+            return compressBody(self.request, json.dumps(result), self.compressionLevel)
+
+        if action == "syncFiles":
+            authorize(self.context, self.request)
+            self.request.response.setHeader("Content-Type", "application/json")
+            # The content of each file is sent as "file/" followed by its path
+            return json.dumps(
+                self.syncFiles(
+                    self.request.get("path", ""),
+                    self.request.get("manifest", ""),
+                    {
+                        name[len("file/") :]: value
+                        for name, value in self.request.form.items()
+                        if name.startswith("file/")
+                    },
+                    bool(self.request.get("delete")),
+                )
+            )
+
+        if action == "exportArchive":
+            return self.exportArchive(
+                self.request.get("path", ""),
+                self.request.get("compression") or "deflated",
+            )
+
     def download(self, path):
-        """Serve the requested file to the user"""
+        """Serve the requested file to the user. Supports Range requests,
+        see download.serveFile().
+        """
         npath = self.normalizePath(path)
         parentPath = "/".join(npath.split("/")[:-1])
         name = npath.split("/")[-1]
@@ -555,8 +1706,36 @@ class FileManagerActions(BrowserView):
             "Content-Disposition", f'attachment; filename="{name}"'
         )
 
-        # TODO: Use streams here if we can
-        return parent.readFile(name)
+        return serveFile(self.request, parent, name)
+
+    def exportArchive(self, path="", compression="deflated"):
+        """Serve a zip archive of the folder at the given path. Entries are
+        "stored" or "deflated", depending on "compression".
+
+        Archives of filesystem directories are made while they are sent.
+        Those of persistent directories are written to a temporary file
+        first, since the database cannot be read after the request.
+        """
+        if compression not in COMPRESSION:
+            raise BadRequest(f"Invalid compression {compression!r}")
+        path = self.normalizePath(path)
+        try:
+            folder = self.getObject(path)
+        except KeyError:
+            raise NotFound(path)
+        if not IResourceDirectory.providedBy(folder):
+            raise NotFound(path)
+
+        name = path.split("/")[-1] or self.resourceDirectory.__name__ or "archive"
+        self.request.response.setHeader("Content-Type", "application/zip")
+        self.request.response.setHeader(
+            "Content-Disposition", f'attachment; filename="{name}.zip"'
+        )
+        if isinstance(folder, FilesystemResourceDirectory):
+            return ArchiveIterator(iterArchive(folder, COMPRESSION[compression]))
+        result = spoolArchive(folder, COMPRESSION[compression])
+        self.request.response.setHeader("Content-Length", str(len(result)))
+        return result
 
     def __call__(self):
         action = self.request.get("action")
@@ -571,6 +1750,8 @@ class FileManager(BrowserView):
     imageExtensions = ["png", "gif", "jpg", "jpeg"]
     knownExtensions = ["css", "html", "htm", "txt", "xml", "js", "cfg"]
     capabilities = ["download", "rename", "delete"]
+    # Level of the compression of responses, None for the default
+    compressionLevel = None
 
     extensionsWithIcons = frozenset(
         [
@@ -618,7 +1799,17 @@ class FileManager(BrowserView):
         ]
     )
 
-    protectedActions = ("addfolder", "add", "addnew", "rename", "delete")
+    protectedActions = (
+        "addfolder",
+        "add",
+        "addnew",
+        "rename",
+        "delete",
+        "uploadinit",
+        "uploadchunk",
+        "uploadfinish",
+        "importarchive",
+    )
 
     def pattern_options(self):
         site = getSite()
@@ -645,9 +1836,49 @@ class FileManager(BrowserView):
         textareaWrap = False
 
         if mode == "getfolder":
-            response = self.getFolder(
-                path=urllib.parse.unquote(form["path"]),
-                getSizes=form.get("getsizes", "false") == "true",
+            if notModified(self.resourceDirectory, self.request):
+                return ""
+            key = versionedKey(
+                self.resourceDirectory,
+                "getfolder",
+                self.portalUrl,
+                self.request.get("LANGUAGE"),
+                *(
+                    form.get(name)
+                    for name in ("path", "getsizes", "limit", "cursor", "sort", "type")
+                ),
+            )
+            body = cachedBody(
+                self.request, self.directoryKey, key, self.compressionLevel
+            )
+            if body is not None:
+                self.request.response.setHeader("Content-Type", "application/json")
+                return body
+            try:
+                response = self.getFolder(
+                    path=urllib.parse.unquote(form["path"]),
+                    getSizes=form.get("getsizes", "false") == "true",
+                    limit=parseLimit(form.get("limit")),
+                    cursor=form.get("cursor") or None,
+                    sort=form.get("sort") or None,
+                    filterType=form.get("type") or None,
+                )
+            except ValueError:
+                response = {
+                    "error": translate(
+                        _("filemanager_invalid_request", default="Invalid request."),
+                        context=self.request,
+                    ),
+                    "code": 1,
+                }
+                key = None
+            self.request.response.setHeader("Content-Type", "application/json")
+            return compressBody(
+                self.request,
+                json.dumps(response),
+                self.compressionLevel,
+                directory=self.directoryKey,
+                key=key,
             )
         elif mode == "getinfo":
             response = self.getInfo(
@@ -666,6 +1897,38 @@ class FileManager(BrowserView):
                 newfile=form["newfile"],
                 replacepath=form.get("replacepath", None),
             )
+        elif mode == "uploadinit":
+            size = form.get("size")
+            try:
+                size = int(size) if size else None
+            except ValueError:
+                raise BadRequest("Invalid size")
+            response = self.uploadInit(
+                path=urllib.parse.unquote(form.get("currentpath", "")),
+                name=urllib.parse.unquote(form.get("name", "")),
+                replacepath=form.get("replacepath", None),
+                size=size,
+            )
+        elif mode == "uploadstatus":
+            response = self.uploadStatus(upload=form["upload"])
+        elif mode == "uploadchunk":
+            try:
+                offset = int(form.get("offset", ""))
+            except ValueError:
+                raise BadRequest("Invalid offset")
+            response = self.uploadChunk(
+                upload=form["upload"],
+                offset=offset,
+                chunk=form["chunk"],
+            )
+        elif mode == "uploadfinish":
+            response = self.uploadFinish(upload=form["upload"])
+        elif mode == "importarchive":
+            response = self.importArchive(
+                path=urllib.parse.unquote(form.get("currentpath", "")),
+                archive=form["archive"],
+                replace=form.get("replace", "false") == "true",
+            )
         elif mode == "addnew":
             response = self.addNew(
                 path=urllib.parse.unquote(form["path"]),
@@ -718,6 +1981,23 @@ class FileManager(BrowserView):
     def resourceDirectory(self):
         return self.context
 
+    @zproperty.Lazy
+    def directoryKey(self):
+        return directoryKey(self.resourceDirectory)
+
+    @zproperty.Lazy
+    def _sizeUnits(self):
+        return {}
+
+    def sizeUnit(self, specifier):
+        """Return the translated unit ("kb" or "mb") for file sizes."""
+        if specifier not in self._sizeUnits:
+            self._sizeUnits[specifier] = translate(
+                _(f"filemanager_{specifier}", default=specifier),
+                context=self.request,
+            )
+        return self._sizeUnits[specifier]
+
     @zproperty.Lazy
     def resourceType(self):
         return self.resourceDirectory.__parent__.__parent__.__name__
@@ -766,7 +2046,15 @@ var BASE_URL = '{}';
 
     # AJAX responses
 
-    def getFolder(self, path, getSizes=False):
+    def getFolder(
+        self,
+        path,
+        getSizes=False,
+        limit=None,
+        cursor=None,
+        sort=None,
+        filterType=None,
+    ):
         """Returns a dict of file and folder objects representing the
         contents of the given directory (indicated by a "path" parameter). The
         values are dicts as returned by getInfo().
@@ -779,30 +2067,76 @@ var BASE_URL = '{}';
         files (depending on the connector). If a "type" parameter is given for
         the HTML document, the same parameter value is reused and passed
         to getFolder(). This can be used for example to only show image files
-        in a file system tree.
+        in a file system tree. It is passed as "filterType" and accepts
+        "folders", "images", "text" or a comma separated list of extensions;
+        files are filtered while the directory is scanned.
+
+        To page through large directories, pass "limit" and then the
+        "cursor" returned with each page to get the next one. The result is
+        then a dict with the "items" of the page and the "cursor" of the
+        next page (None after the last one). "sort" orders the items by
+        "name", "size" or "mtime", folders still before files. An invalid
+        limit, cursor or sort order raises ValueError.
         """
-        folders = []
-        files = []
-
         path = self.normalizePath(path)
         folder = self.getObject(path)
 
-        for name in folder.listDirectory():
-            if IResourceDirectory.providedBy(folder[name]):
-                folders.append(self.getInfo(path=f"{path}/{name}/", getSize=getSizes))
+        def getInfo(entry):
+            if entry.isDirectory:
+                itemPath = f"{path}/{entry.name}/"
             else:
-                files.append(self.getInfo(path=f"{path}/{name}", getSize=getSizes))
-        return folders + files
+                itemPath = f"{path}/{entry.name}"
+            return self.getInfo(path=itemPath, getSize=getSizes, entry=entry)
+
+        accept = typeFilter(filterType)
+        if limit is None and cursor is None and sort is None:
+            folders = []
+            files = []
+            for entry in scanDirectory(folder, accept=accept):
+                if entry.isDirectory:
+                    folders.append(getInfo(entry))
+                else:
+                    files.append(getInfo(entry))
+            return folders + files
 
-    def getInfo(self, path, getSize=False):
+        entries, nextCursor = pageDirectory(
+            folder, limit, cursor, sort or "name", accept
+        )
+        items = [getInfo(entry) for entry in entries]
+        if limit is None and cursor is None:
+            return items
+        return {"items": items, "cursor": nextCursor}
+
+    def getInfo(self, path, getSize=False, entry=None):
         """Returns information about a single file. Requests
         with mode "getinfo" will include an additional parameter, "path",
         indicating which file to inspect. A boolean parameter "getsize"
         indicates whether the dimensions of the file (if an image) should be
         returned.
+
+        If the file was found by scanDirectory(), its DirectoryEntry can be
+        passed as "entry" to avoid looking it up again.
+
+        The result is cached as long as the file is not modified.
         """
         path = self.normalizePath(path)
-        obj = self.getObject(path)
+        if entry is None:
+            obj = self.getObject(path)
+        else:
+            obj = entry.object
+
+        stamp = modificationStamp(obj, entry)
+        if stamp is not None:
+            cacheKey = (
+                self.__class__.__name__,
+                path,
+                stamp,
+                self.request.get("LANGUAGE"),
+                self.portalUrl,
+            )
+            info = infoCache.get(self.directoryKey, cacheKey)
+            if info is not None:
+                return info
 
         filename = obj.__name__
         error = ""
@@ -813,20 +2147,18 @@ var BASE_URL = '{}';
         }
 
         if isinstance(obj, File):
-            properties["dateModified"] = DateTime(obj._p_mtime).strftime("%c")
-            size = obj.get_size() / 1024
+            if entry is None:
+                mtime, size = obj._p_mtime, obj.get_size()
+            else:
+                mtime, size = entry.mtime, entry.size
+            properties["dateModified"] = DateTime(mtime).strftime("%c")
+            size = size / 1024
             if size < 1024:
                 size_specifier = "kb"
             else:
                 size_specifier = "mb"
                 size = size / 1024
-            properties["size"] = "{}{}".format(
-                size,
-                translate(
-                    _(f"filemanager_{size_specifier}", default=size_specifier),
-                    context=self.request,
-                ),
-            )
+            properties["size"] = f"{size}{self.sizeUnit(size_specifier)}"
 
         fileType = "txt"
 
@@ -856,7 +2188,7 @@ var BASE_URL = '{}';
             properties["height"] = obj.height
             properties["width"] = obj.width
 
-        return {
+        info = {
             "path": self.normalizeReturnPath(path),
             "filename": filename,
             "fileType": fileType,
@@ -865,6 +2197,9 @@ var BASE_URL = '{}';
             "error": error,
             "code": errorCode,
         }
+        if stamp is not None:
+            infoCache.set(self.directoryKey, cacheKey, info)
+        return info
 
     def addFolder(self, path, name):
         """Create a new directory on the server within the given path."""
@@ -910,6 +2245,11 @@ var BASE_URL = '{}';
                         context=self.request,
                     )
                     code = 1
+                else:
+                    modified(
+                        self.resourceDirectory,
+                        ("add", self.normalizeReturnPath(f"{parentPath}/{name}")),
+                    )
 
         return {
             "parent": self.normalizeReturnPath(parentPath),
@@ -967,6 +2307,8 @@ var BASE_URL = '{}';
                         context=self.request,
                     )
                     code = 1
+                else:
+                    filesWritten(self.resourceDirectory)
 
         return {
             "parent": self.normalizeReturnPath(parentPath),
@@ -976,6 +2318,293 @@ var BASE_URL = '{}';
             "code": code,
         }
 
+    def uploadInit(self, path, name, replacepath=None, size=None):
+        """Start a chunked upload of the file "name" to the directory at
+        "path", or of a replacement for the file at "replacepath". The
+        response includes the id of the "upload" and the "offset" of the
+        first chunk. An optional "size" is checked when the upload is
+        finished.
+        """
+        parentPath = self.normalizePath(path)
+
+        error = ""
+        code = 0
+        upload = None
+
+        if replacepath:
+            newPath = self.normalizePath(replacepath)
+            parentPath = self.parentPath(newPath)
+            name = newPath.split("/")[-1]
+        else:
+            newPath = f"{parentPath}/{name}"
+
+        try:
+            parent = self.getObject(parentPath)
+        except KeyError:
+            error = translate(
+                _("filemanager_invalid_parent", default="Parent folder not found."),
+                context=self.request,
+            )
+            code = 1
+        else:
+            if not validateFilename(name):
+                error = translate(
+                    _("filemanager_invalid_filename", default="Invalid file name."),
+                    context=self.request,
+                )
+                code = 1
+            elif name in parent and not replacepath:
+                error = translate(
+                    _("filemanager_error_file_exists", default="File already exists."),
+                    context=self.request,
+                )
+                code = 1
+            else:
+                upload = startUpload(
+                    {
+                        "path": newPath,
+                        "name": name,
+                        "replace": bool(replacepath),
+                        "size": size,
+                        "user": getSecurityManager().getUser().getId(),
+                        "directory": list(self.directoryKey),
+                    }
+                )
+
+        return {
+            "upload": upload,
+            "offset": 0,
+            "parent": self.normalizeReturnPath(parentPath),
+            "name": name,
+            "error": error,
+            "code": code,
+        }
+
+    def getUpload(self, upload):
+        """Return the metadata and the offset of an upload started by the
+        current user in this resource directory. Raises KeyError otherwise.
+        """
+        metadata, offset = getUpload(upload)
+        if metadata["user"] != getSecurityManager().getUser().getId():
+            raise KeyError(upload)
+        if metadata["directory"] != list(self.directoryKey):
+            raise KeyError(upload)
+        return metadata, offset
+
+    def uploadStatus(self, upload):
+        """Report the offset of an upload, e.g. to resume it after the
+        connection dropped.
+        """
+        try:
+            metadata, offset = self.getUpload(upload)
+        except KeyError:
+            return {
+                "upload": upload,
+                "error": translate(
+                    _("filemanager_invalid_upload", default="Upload not found."),
+                    context=self.request,
+                ),
+                "code": 1,
+            }
+        return {
+            "upload": upload,
+            "offset": offset,
+            "size": metadata["size"],
+            "error": "",
+            "code": 0,
+        }
+
+    def uploadChunk(self, upload, offset, chunk):
+        """Append a chunk to an upload. "offset" must be the offset reported
+        by the previous response; if it is not, nothing is written and the
+        response holds the offset to resume from.
+        """
+        error = ""
+        code = 0
+
+        try:
+            metadata, current = self.getUpload(upload)
+            current = appendChunk(upload, offset, chunk)
+        except KeyError:
+            return self.uploadStatus(upload)
+        except ValueError:
+            error = translate(
+                _("filemanager_invalid_offset", default="Unexpected chunk offset."),
+                context=self.request,
+            )
+            code = 1
+
+        return {
+            "upload": upload,
+            "offset": current,
+            "error": error,
+            "code": code,
+        }
+
+    def uploadFinish(self, upload):
+        """Write the uploaded file to the resource directory. The staged
+        data is removed once the transaction is committed.
+        """
+        try:
+            metadata, offset = self.getUpload(upload)
+        except KeyError:
+            return self.uploadStatus(upload)
+
+        error = ""
+        code = 0
+        newPath = metadata["path"]
+        parentPath = self.parentPath(newPath)
+        name = metadata["name"]
+
+        try:
+            parent = self.getObject(parentPath)
+        except KeyError:
+            error = translate(
+                _("filemanager_invalid_parent", default="Parent folder not found."),
+                context=self.request,
+            )
+            code = 1
+        else:
+            if metadata["size"] is not None and offset != metadata["size"]:
+                error = translate(
+                    _("filemanager_upload_incomplete", default="Upload incomplete."),
+                    context=self.request,
+                )
+                code = 1
+            elif name in parent and not metadata["replace"]:
+                error = translate(
+                    _("filemanager_error_file_exists", default="File already exists."),
+                    context=self.request,
+                )
+                code = 1
+            else:
+                with openUpload(upload) as data:
+                    self.resourceDirectory.writeFile(newPath, data)
+                filesWritten(self.resourceDirectory)
+
+                def removeStaged(success):
+                    if success:
+                        removeUpload(upload)
+
+                transaction.get().addAfterCommitHook(removeStaged)
+
+        return {
+            "parent": self.normalizeReturnPath(parentPath),
+            "path": self.normalizeReturnPath(newPath),
+            "name": name,
+            "error": error,
+            "code": code,
+        }
+
+    def importArchive(self, path, archive, replace=False):
+        """Unpack the uploaded zip "archive" into the directory at "path".
+
+        All entries are checked before anything is written, so an archive
+        that cannot be imported leaves the directory as it is. Files of the
+        archive replace existing files of the same name; with "replace",
+        the current content of the directory is removed first. Members are
+        unpacked one at a time, so that large ones are not held in memory.
+        """
+        parentPath = self.normalizePath(path)
+
+        error = ""
+        code = 0
+        folders = files = ()
+
+        try:
+            parent = self.getObject(parentPath)
+        except KeyError:
+            error = translate(
+                _("filemanager_invalid_parent", default="Parent folder not found."),
+                context=self.request,
+            )
+            code = 1
+        else:
+            try:
+                zf = zipfile.ZipFile(archive)
+            except (zipfile.BadZipFile, OSError):
+                error = translate(
+                    _(
+                        "filemanager_error_archive_invalid",
+                        default="Could not read archive.",
+                    ),
+                    context=self.request,
+                )
+                code = 1
+            else:
+                with zf:
+                    try:
+                        folders, files = archiveEntries(zf)
+                        if not replace:
+                            self.checkImport(parent, folders, files)
+                    except ValueError as e:
+                        error = translate(
+                            _(
+                                "filemanager_invalid_archive_entry",
+                                default="Invalid file name in archive: ${name}",
+                                mapping={"name": e.args[0]},
+                            ),
+                            context=self.request,
+                        )
+                        code = 1
+                    else:
+                        self.unpackArchive(
+                            parentPath, parent, zf, folders, files, replace
+                        )
+
+        return {
+            "parent": self.normalizeReturnPath(parentPath),
+            "folders": len(folders) if code == 0 else 0,
+            "files": len(files) if code == 0 else 0,
+            "error": error,
+            "code": code,
+        }
+
+    def checkImport(self, parent, folders, files):
+        """Raise ValueError with the path of the first folder of an archive
+        that exists as a file, or file that exists as a folder.
+        """
+        for folder in folders:
+            if isinstance(lookup(parent, folder), (File, FilesystemFile)):
+                raise ValueError(folder + "/")
+        for path, info in files:
+            if IResourceDirectory.providedBy(lookup(parent, path)):
+                raise ValueError(path)
+
+    def unpackArchive(self, parentPath, parent, zf, folders, files, replace):
+        def fullPath(path):
+            return f"{parentPath}/{path}" if parentPath else path
+
+        if replace:
+            names = parent.listDirectory()
+            for name in names:
+                del parent[name]
+            modified(
+                self.resourceDirectory,
+                *(("remove", "/" + fullPath(name)) for name in names),
+            )
+
+        added = [
+            folder
+            for folder in folders
+            if not IResourceDirectory.providedBy(lookup(parent, folder))
+        ]
+        for folder in added:
+            parent.makeDirectory(folder)
+        modified(
+            self.resourceDirectory,
+            *(("add", "/" + fullPath(folder)) for folder in added),
+        )
+
+        for path, info in files:
+            data = readMember(zf, info)
+            try:
+                self.resourceDirectory.writeFile(fullPath(path), data)
+            finally:
+                if not isinstance(data, bytes):
+                    data.close()
+        filesWritten(self.resourceDirectory)
+
     def addNew(self, path, name):
         """Add a new empty file in the given directory"""
         error = ""
@@ -1007,6 +2636,7 @@ var BASE_URL = '{}';
                 code = 1
             else:
                 self.resourceDirectory.writeFile(newPath, b"")
+                filesWritten(self.resourceDirectory)
 
         return {
             "parent": self.normalizeReturnPath(parentPath),
@@ -1045,6 +2675,14 @@ var BASE_URL = '{}';
                     code = 1
                 else:
                     parent.rename(oldName, newName)
+                    modified(
+                        self.resourceDirectory,
+                        (
+                            "rename",
+                            "/" + npath,
+                            self.normalizeReturnPath(f"{oldPath}/{newName}"),
+                        ),
+                    )
 
         return {
             "oldParent": self.normalizeReturnPath(oldPath),
@@ -1080,6 +2718,8 @@ var BASE_URL = '{}';
                     context=self.request,
                 )
                 code = 1
+            else:
+                modified(self.resourceDirectory, ("remove", "/" + npath))
 
         return {
             "path": self.normalizeReturnPath(path),
@@ -1146,6 +2786,10 @@ var BASE_URL = '{}';
             obj = parent[filename]
             del parent[filename]
             target[filename] = obj
+            modified(
+                self.resourceDirectory,
+                ("rename", "/" + npath, self.normalizeReturnPath(newCanonicalPath)),
+            )
 
         return {
             "code": code,
@@ -1154,7 +2798,9 @@ var BASE_URL = '{}';
         }
 
     def download(self, path):
-        """Serve the requested file to the user"""
+        """Serve the requested file to the user. Supports Range requests,
+        see download.serveFile().
+        """
         npath = self.normalizePath(path)
         parentPath = "/".join(npath.split("/")[:-1])
         name = npath.split("/")[-1]
@@ -1166,8 +2812,7 @@ var BASE_URL = '{}';
             "Content-Disposition", f'attachment; filename="{name}"'
         )
 
-        # TODO: Use streams here if we can
-        return parent.readFile(name)
+        return serveFile(self.request, parent, name)
 
     # Helpers
     def getObject(self, path):
@@ -1209,33 +2854,66 @@ var BASE_URL = '{}';
             result["info"] = self.previewTemplate(info=info)
 
         self.request.response.setHeader("Content-Type", "application/json")
-        return json.dumps(result)
+        return compressBody(self.request, json.dumps(result), self.compressionLevel)
 
-    def saveFile(self, path, value):
+    def saveFile(self, path, value=None):
         path = self.request.form.get("path", path)
         value = self.request.form.get("value", value)
         path = path.lstrip("/")
+        patch = self.request.form.get("patch")
+        if patch is None and value is None:
+            self.request.response.setStatus(400)
+            return " "
+        version = self.request.form.get("version") or self.request.getHeader("If-Match")
+        if version and isStale(self.context, path, version):
+            self.request.response.setStatus(412)
+            return " "
+        if patch is not None:
+            # A delta save, see FileManagerActions.saveFile()
+            try:
+                value = patchedValue(
+                    self.context, path, patch, self.request.form.get("base")
+                )
+            except ValueError:
+                self.request.response.setStatus(400)
+                return " "
+            if value is None:
+                self.request.response.setStatus(409)
+                return " "
         value = value.replace("\r\n", "\n")
+        if isUnchanged(self.context, path, value):
+            return "unchanged"
+        makeParents(self.context, path)
         self.context.writeFile(path, value)
+        filesWritten(self.context)
         return " "  # Zope does not like empty responses
 
     def filetree(self):
+        if notModified(self.context, self.request):
+            return ""
         foldersOnly = bool(self.request.get("foldersOnly", False))
 
         def getFolder(root, relpath=""):
-            result = []
-            for name in root.listDirectory():
+            for entry in scanDirectory(root):
+                name = entry.name
                 path = f"{relpath}/{name}"
-                if IResourceDirectory.providedBy(root[name]):
+                if entry.isDirectory:
                     item = {"title": name, "key": path, "isFolder": True}
-                    item["children"] = getFolder(root[name], path)
-                    result.append(item)
+                    item["children"] = getFolder(entry.object, path)
+                    yield item
                 elif not foldersOnly:
-                    item = {"title": name, "key": path}
-                    result.append(item)
-            return result
-
-        return json.dumps(
+                    yield {"title": name, "key": path}
+
+        key = versionedKey(self.context, "filetree", foldersOnly)
+        body = cachedBody(self.request, self.directoryKey, key, self.compressionLevel)
+        if body is not None:
+            self.request.response.setHeader("Content-Type", "application/json")
+            return body
+        writer = CompressingWriter(
+            self.request, self.compressionLevel, directory=self.directoryKey, key=key
+        )
+        writeJSON(
+            self.request.response,
             [
                 {
                     "title": "/",
@@ -1244,5 +2922,8 @@ var BASE_URL = '{}';
                     "expand": True,
                     "children": getFolder(self.context),
                 }
-            ]
+            ],
+            writer,
         )
+        writer.close()
+        return ""
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from OFS.Image import File
+from plone.resource.file import FilesystemFile
+from plone.resourceeditor.state import getContainer
+
+import threading
+
+# Maximum number of getInfo() results kept per process
+INFO_CACHE_SIZE = 10000
+
+# Maximum number of line indexes of text files kept per process
+LINE_INDEX_CACHE_SIZE = 100
+
+# Maximum number of content hashes of files kept per process
+HASH_CACHE_SIZE = 10000
+
+# Maximum number of compressed responses kept per process
+COMPRESSED_CACHE_SIZE = 100
+
+
+def copyInfo(info):
+    """Copy an info dict deep enough that callers can change it."""
+    info = dict(info)
+    if "properties" in info:
+        info["properties"] = dict(info["properties"])
+    return info
+
+
+class InfoCache:
+    """A bounded, thread safe LRU cache of file information.
+
+    Entries are grouped by resource directory. Invalidating a directory
+    bumps its generation, which makes all its entries unreachable; they
+    are then evicted as the least recently used ones.
+
+    Values are copied with "copy" when they are stored and returned, so
+    callers can change them; with None they are stored as they are.
+    """
+
+    def __init__(self, size=INFO_CACHE_SIZE, copy=copyInfo):
+        self.size = size
+        self.copy = copy
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, directory, key):
+        with self._lock:
+            key = (directory, self._generations.get(directory, 0), key)
+            info = self._data.get(key)
+            if info is None:
+                return None
+            self._data.move_to_end(key)
+        if self.copy is not None:
+            info = self.copy(info)
+        return info
+
+    def set(self, directory, key, info):
+        if self.copy is not None:
+            info = self.copy(info)
+        with self._lock:
+            key = (directory, self._generations.get(directory, 0), key)
+            self._data[key] = info
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, directory):
+        with self._lock:
+            self._generations[directory] = self._generations.get(directory, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+
+
+infoCache = InfoCache()
+lineIndexCache = InfoCache(LINE_INDEX_CACHE_SIZE, copy=None)
+hashCache = InfoCache(HASH_CACHE_SIZE, copy=None)
+compressedCache = InfoCache(COMPRESSED_CACHE_SIZE, copy=None)
+
+
+def directoryKey(resourceDirectory):
+    """Return a hashable key identifying a resource directory."""
+    container = getContainer(resourceDirectory)
+    if container is not None:
+        return ("persistent",) + tuple(container.getPhysicalPath())
+    directory = getattr(resourceDirectory, "directory", None)
+    if directory is not None:
+        return ("filesystem", directory)
+    return (resourceDirectory.__class__.__name__, id(resourceDirectory))
+
+
+def modificationStamp(obj, entry=None):
+    """Return a value that changes whenever the file changes, or None if
+    there is no reliable one (directories, objects not yet committed).
+    """
+    if entry is not None:
+        if entry.isDirectory or entry.mtime is None:
+            return None
+        return (entry.mtime, entry.size)
+    if isinstance(obj, File):
+        if obj._p_mtime is None:
+            return None
+        return (obj._p_mtime, obj.get_size())
+    if isinstance(obj, FilesystemFile):
+        return (obj.lastModifiedTimestamp, None)
+    return None
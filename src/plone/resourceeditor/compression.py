@@ -0,0 +1,192 @@
+"""Content encoding of JSON and text responses.
+
+Responses are compressed with brotli if the client accepts it and the
+``brotli`` package is installed, or else with gzip. Compressed forms of
+results tied to a version of a resource directory are cached, so an
+unchanged tree is compressed only once.
+"""
+
+from plone.resourceeditor.cache import compressedCache
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESS_MIN_SIZE = 1024
+
+# Default levels: gzip from 1 to 9, brotli quality from 0 to 11
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Compressed bodies larger than this many bytes are not cached
+COMPRESSED_CACHE_MAX_BYTES = 1 << 22
+
+
+def acceptedEncoding(request):
+    """Return the content encoding to use for the response, "br" or "gzip",
+    or None if the client does not accept either.
+    """
+    header = request.getHeader("Accept-Encoding", "") or ""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class Compressor:
+    """Compress data in pieces with the given encoding and level."""
+
+    def __init__(self, encoding, level=None):
+        if encoding == "br":
+            if level is None:
+                level = BROTLI_QUALITY
+            self._compressor = brotli.Compressor(quality=level)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.finish
+        else:
+            if level is None:
+                level = GZIP_LEVEL
+            # wbits 31 writes the gzip header and trailer
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.flush = self._compressor.flush
+
+
+def setEncodingHeaders(response, encoding):
+    """Set the headers of a body encoded with "encoding".
+
+    A strong ETag names the bytes of one representation, so the ETag set
+    for the uncompressed body is made weak: it is then valid for all
+    content codings of the same content.
+    """
+    response.setHeader("Content-Encoding", encoding)
+    # The body is already encoded, so Zope must not compress it again
+    response.enableHTTPCompression(disable=True)
+    etag = response.getHeader("ETag")
+    if etag and not etag.startswith("W/"):
+        response.setHeader("ETag", f"W/{etag}")
+
+
+def setVary(response):
+    vary = response.getHeader("Vary")
+    if vary is None:
+        response.setHeader("Vary", "Accept-Encoding")
+    elif "accept-encoding" not in vary.lower():
+        response.setHeader("Vary", f"{vary}, Accept-Encoding")
+
+
+def cachedBody(request, directory, key, level=None):
+    """Return the cached compressed body of the result identified by "key"
+    for the given resource directory (see directoryKey()) and set its
+    headers, or None if it is not cached.
+    """
+    if key is None:
+        return None
+    encoding = acceptedEncoding(request)
+    if encoding is None:
+        return None
+    body = compressedCache.get(directory, (key, encoding, level))
+    if body is not None:
+        setEncodingHeaders(request.response, encoding)
+        setVary(request.response)
+    return body
+
+
+def compressBody(
+    request, body, level=None, minSize=COMPRESS_MIN_SIZE, directory=None, key=None
+):
+    """Return the body of a response, compressed if the client accepts it
+    and it is at least "minSize" bytes long. Otherwise the body is returned
+    as it is. If a "key" is given, the compressed body is cached for
+    cachedBody().
+    """
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    if len(data) < minSize:
+        return body
+    setVary(request.response)
+    encoding = acceptedEncoding(request)
+    if encoding is None:
+        return body
+    compressor = Compressor(encoding, level)
+    data = compressor.compress(data) + compressor.flush()
+    setEncodingHeaders(request.response, encoding)
+    if key is not None and len(data) <= COMPRESSED_CACHE_MAX_BYTES:
+        compressedCache.set(directory, (key, encoding, level), data)
+    return data
+
+
+class CompressingWriter:
+    """Write a streamed response body, compressed if the client accepts it
+    and the first piece written is at least "minSize" bytes long. Call
+    close() after the last piece.
+
+    If a "key" is given, the compressed body is kept and cached for
+    cachedBody() when the writer is closed.
+    """
+
+    def __init__(
+        self, request, level=None, minSize=COMPRESS_MIN_SIZE, directory=None, key=None
+    ):
+        self.request = request
+        self.response = request.response
+        self.level = level
+        self.minSize = minSize
+        self.directory = directory
+        self.key = key
+        self.encoding = None
+        self.compressor = None
+        self.started = False
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        if not self.started:
+            self.started = True
+            if len(data) >= self.minSize:
+                setVary(self.response)
+                self.encoding = acceptedEncoding(self.request)
+            if self.encoding is not None:
+                setEncodingHeaders(self.response, self.encoding)
+                self.compressor = Compressor(self.encoding, self.level)
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self._write(data)
+
+    def close(self):
+        if self.compressor is None:
+            return
+        self._write(self.compressor.flush())
+        if self.key is not None and self.chunks is not None:
+            compressedCache.set(
+                self.directory,
+                (self.key, self.encoding, self.level),
+                b"".join(self.chunks),
+            )
+
+    def _write(self, data):
+        if not data:
+            return
+        self.response.write(data)
+        if self.key is not None and self.chunks is not None:
+            self.size += len(data)
+            if self.size > COMPRESSED_CACHE_MAX_BYTES:
+                self.chunks = None
+            else:
+                self.chunks.append(data)
@@ -0,0 +1,62 @@
+from urllib.parse import urlparse
+
+import functools
+import posixpath
+import re
+
+# The tokens of a stylesheet that URLs are rewritten in. Comments and other
+# strings are matched too, so that URL-like text inside them is skipped.
+_tokens = re.compile(
+    r"""
+    (?P<comment>/\*.*?\*/)
+    | url\(\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[^)"'\s]*))\s*\)
+    | @import\s*(?:"(?P<idq>[^"]*)"|'(?P<isq>[^']*)')
+    | "(?:\\.|[^"\\])*"
+    | '(?:\\.|[^'\\])*'
+    """,
+    re.VERBOSE | re.DOTALL | re.IGNORECASE,
+)
+
+_urlGroups = ("dq", "sq", "bare", "idq", "isq")
+
+
+@functools.lru_cache(maxsize=4096)
+def relativeUrl(url, base):
+    """Return "url" relative to the directory of the URL "base" if it
+    points to the same host, or None otherwise.
+    """
+    base = urlparse(base)
+    asset = urlparse(url)
+    if base.netloc != asset.netloc:
+        return None
+    out = posixpath.relpath("." + asset.path, start="." + posixpath.dirname(base.path))
+    if asset.query:
+        out += "?" + asset.query
+    if asset.fragment:
+        out += "#" + asset.fragment
+    return out
+
+
+def rewriteUrls(css, base):
+    """Make the URLs of ``url()`` and ``@import`` in a stylesheet that
+    point to the host of "base" relative to it.
+
+    The stylesheet is rewritten in a single pass; URLs in comments and
+    other strings are left alone.
+    """
+
+    def replace(match):
+        for group in _urlGroups:
+            url = match.group(group)
+            if url is not None:
+                break
+        else:
+            return match.group(0)
+        out = relativeUrl(url, base)
+        if out is None:
+            return match.group(0)
+        token = match.group(0)
+        start = match.start(group) - match.start()
+        return token[:start] + out + token[start + len(url) :]
+
+    return _tokens.sub(replace, css)
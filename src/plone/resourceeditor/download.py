@@ -0,0 +1,243 @@
+from array import array
+from bisect import bisect_right
+from email.utils import formatdate
+from OFS.Image import File
+from OFS.Image import Pdata
+from operator import itemgetter
+from plone.resource.directory import FilesystemResourceDirectory
+from plone.resource.file import FilesystemFile
+from zExceptions import NotFound
+from zope.interface import implementer
+from ZPublisher.HTTPRangeSupport import expandRanges
+from ZPublisher.HTTPRangeSupport import parseRange
+from ZPublisher.Iterators import filestream_iterator
+from ZPublisher.Iterators import IStreamIterator
+
+import os
+import stat
+import tempfile
+
+# Size of the chunks files are read and sent in
+CHUNK_SIZE = 1 << 16
+
+
+@implementer(IStreamIterator)
+class RangeIterator:
+    """Iterate over "length" bytes of an open file, starting at its
+    current position, in chunks. The file is closed when done.
+    """
+
+    def __init__(self, file, length, chunkSize=CHUNK_SIZE):
+        self.file = file
+        self.length = length
+        self.remaining = length
+        self.chunkSize = chunkSize
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining > 0:
+            data = self.file.read(min(self.chunkSize, self.remaining))
+            if data:
+                self.remaining -= len(data)
+                return data
+        self.file.close()
+        raise StopIteration
+
+    def __len__(self):
+        return self.length
+
+    def close(self):
+        self.file.close()
+
+
+def iterPdata(data, start, end, chunks=None):
+    """Yield the bytes from start to end of the data of an OFS file, which
+    is either bytes or a chain of Pdata chunks. Chunks are deactivated once
+    read, so they do not pile up in the ZODB cache.
+
+    Finding a chunk means loading all chunks before it, since each one
+    holds the link to the next. "chunks" is an optional list of the
+    (offset, oid) of the chunks: an empty list is filled in while reading
+    from the first chunk on, and a filled one is used to load the chunk
+    holding "start" directly.
+    """
+    if not isinstance(data, Pdata):
+        yield bytes(data[start:end])
+        return
+    offset = 0
+    record = chunks is not None and not chunks
+    if chunks and data._p_jar is not None:
+        index = bisect_right(chunks, start, key=itemgetter(0)) - 1
+        if index >= 0:
+            offset, oid = chunks[index]
+            data = data._p_jar.get(oid)
+    while data is not None and offset < end:
+        if record and data._p_oid is not None:
+            chunks.append((offset, data._p_oid))
+        chunk = data.data
+        size = len(chunk)
+        if offset + size > start:
+            yield bytes(chunk[max(start - offset, 0) : end - offset])
+        offset += size
+        nextData = data.next
+        data._p_deactivate()
+        data = nextData
+
+
+def readHead(obj, length):
+    """Return the first "length" bytes of a file of a resource directory
+    and its total size, without reading the rest of it. Returns None for
+    objects that are not files.
+    """
+    if isinstance(obj, File):
+        return b"".join(iterPdata(obj.data, 0, length)), obj.get_size()
+    if isinstance(obj, FilesystemFile):
+        with open(obj.path, "rb") as f:
+            return f.read(length), os.fstat(f.fileno()).st_size
+    return None
+
+
+def iterFile(obj, start=0, end=None, chunks=None):
+    """Yield the bytes from start to end (or the end of the file) of a file
+    of a resource directory in chunks. "chunks" is passed to iterPdata()
+    for persistent files.
+    """
+    if isinstance(obj, File):
+        if end is None:
+            end = obj.get_size()
+        yield from iterPdata(obj.data, start, end, chunks)
+        return
+    with open(obj.path, "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def lineOffsets(chunks):
+    """Return an array of the byte offsets at which the lines of a text
+    start, given as chunks of bytes. A final newline does not start a line.
+    """
+    offsets = array("Q", [0])
+    position = 0
+    for chunk in chunks:
+        index = chunk.find(b"\n")
+        while index != -1:
+            offsets.append(position + index + 1)
+            index = chunk.find(b"\n", index + 1)
+        position += len(chunk)
+    if len(offsets) > 1 and offsets[-1] == position:
+        offsets.pop()
+    return offsets
+
+
+def requestedRange(request, size, lastModified):
+    """Return the (start, end) byte range to send: the whole file, unless
+    the request asks for a single satisfiable range with Range (and, if
+    given, an If-Range matching Last-Modified). Returns None if the range
+    cannot be satisfied.
+    """
+    header = request.getHeader("Range", None)
+    if not header:
+        return 0, size
+    ifRange = request.getHeader("If-Range", None)
+    if ifRange and ifRange != lastModified:
+        return 0, size
+    ranges = parseRange(header)
+    if not ranges:
+        return 0, size
+    if len(ranges) > 1:
+        # Multipart byte ranges are not supported; sending the whole
+        # representation is a valid answer.
+        return 0, size
+    ranges = expandRanges(ranges, size)
+    if not ranges:
+        return None
+    return ranges[0]
+
+
+def setRangeHeaders(request, size, mtime):
+    """Set the headers of a download of "size" bytes last modified at
+    "mtime" and return the (start, end) byte range to send, or None if the
+    requested range cannot be satisfied.
+    """
+    response = request.response
+    lastModified = formatdate(mtime or 0, usegmt=True)
+    response.setHeader("Accept-Ranges", "bytes")
+    response.setHeader("Last-Modified", lastModified)
+
+    byteRange = requestedRange(request, size, lastModified)
+    if byteRange is None:
+        response.setStatus(416)
+        response.setHeader("Content-Range", f"bytes */{size}")
+        return None
+    start, end = byteRange
+    if (start, end) != (0, size):
+        response.setStatus(206)
+        response.setHeader("Content-Range", f"bytes {start}-{end - 1}/{size}")
+    response.setHeader("Content-Length", str(end - start))
+    return byteRange
+
+
+def serveFile(request, parent, name):
+    """Set the headers for downloading a file of a resource directory and
+    return its content, honouring Range and If-Range requests.
+
+    Files of filesystem directories are served as file stream iterators,
+    which the WSGI server can send with its file wrapper (sendfile) without
+    copying the data through Python; they are stat'ed only once.
+
+    Small persistent files are returned as bytes, larger ones as a stream
+    iterator reading one chunk at a time. Their data is spooled to a
+    temporary file first, since the iterator is consumed after the ZODB
+    connection of the request has been closed.
+    """
+    if isinstance(parent, FilesystemResourceDirectory):
+        return serveFilesystemFile(request, parent._resolveSubpath(name))
+
+    obj = parent[name]
+    if not isinstance(obj, File):
+        return parent.readFile(name)
+
+    byteRange = setRangeHeaders(request, obj.get_size(), obj._p_mtime)
+    if byteRange is None:
+        return b""
+    start, end = byteRange
+    length = end - start
+
+    if length <= CHUNK_SIZE:
+        return b"".join(iterPdata(obj.data, start, end))
+
+    spool = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+    for chunk in iterPdata(obj.data, start, end):
+        spool.write(chunk)
+    spool.seek(0)
+    return RangeIterator(spool, length)
+
+
+def serveFilesystemFile(request, filepath):
+    try:
+        stats = os.stat(filepath)
+    except OSError:
+        raise NotFound(filepath)
+    if not stat.S_ISREG(stats.st_mode):
+        raise NotFound(filepath)
+
+    byteRange = setRangeHeaders(request, stats.st_size, stats.st_mtime)
+    if byteRange is None:
+        return b""
+    start, end = byteRange
+    if (start, end) == (0, stats.st_size):
+        return filestream_iterator(filepath, "rb", streamsize=CHUNK_SIZE)
+
+    file = open(filepath, "rb")
+    file.seek(start)
+    return RangeIterator(file, end - start)
@@ -0,0 +1,101 @@
+"""Content hashes of files, and delta saves: changes to a text file sent
+as a patch against the version of the file the editor loaded, identified
+by its content hash.
+"""
+
+from plone.resourceeditor.download import CHUNK_SIZE
+from plone.resourceeditor.download import iterFile
+
+import hashlib
+import json
+
+
+def contentHash(data):
+    """Return the hash identifying the content of a file."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def fileHash(obj):
+    """Return the content hash of a file of a resource directory, reading it
+    in chunks.
+    """
+    digest = hashlib.sha256()
+    for chunk in iterFile(obj):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def streamHash(data):
+    """Return the content hash and the size of bytes, text or a file-like
+    object. Files are read in chunks and rewound afterwards.
+    """
+    if isinstance(data, (str, bytes)):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return contentHash(data), len(data)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = data.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    data.seek(0)
+    return digest.hexdigest(), size
+
+
+def parsePatch(value):
+    """Return the splices of a patch given as a list or as its JSON
+    encoding. Raises ValueError if it is not a list.
+    """
+    if isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    if not isinstance(value, list):
+        raise ValueError(f"Invalid patch {value!r}")
+    return value
+
+
+def applyPatch(text, splices):
+    """Apply a patch to a text and return the result.
+
+    Each splice is a list [start, end, text] replacing the characters from
+    start to end of the original text by the given text. Positions count
+    UTF-16 code units, as JavaScript strings and browser editors do, so a
+    character outside the Basic Multilingual Plane counts as two. Splices
+    must be sorted by position, must not overlap and must not split such
+    a character; otherwise ValueError is raised.
+    """
+    units = text.encode("utf-16-le")
+    parts = []
+    position = 0
+    for splice in splices:
+        if not isinstance(splice, (list, tuple)) or len(splice) != 3:
+            raise ValueError(f"Invalid splice {splice!r}")
+        start, end, insert = splice
+        if (
+            not isinstance(start, int)
+            or not isinstance(end, int)
+            or not isinstance(insert, str)
+            or not position <= start <= end <= len(units) // 2
+            or _isLowSurrogate(units, start)
+            or _isLowSurrogate(units, end)
+        ):
+            raise ValueError(f"Invalid splice {splice!r}")
+        parts.append(units[2 * position : 2 * start])
+        # Lone surrogates cannot be encoded and raise UnicodeEncodeError,
+        # a ValueError
+        parts.append(insert.encode("utf-16-le"))
+        position = end
+    parts.append(units[2 * position :])
+    return b"".join(parts).decode("utf-16-le")
+
+
+def _isLowSurrogate(units, index):
+    """Tell whether the code unit at an index of UTF-16-LE encoded text is
+    the second half of a surrogate pair.
+    """
+    high = 2 * index + 1
+    return high < len(units) and 0xDC <= units[high] <= 0xDF
@@ -0,0 +1,291 @@
+from Acquisition import aq_base
+from Acquisition import aq_parent
+from collections import namedtuple
+from OFS.Image import File
+from OFS.interfaces import IObjectManager
+from plone.resource.directory import FilesystemResourceDirectory
+from plone.resource.directory import FILTERS
+from plone.resource.directory import PersistentResourceDirectory
+from plone.resource.file import FilesystemFile
+from plone.resource.interfaces import IResourceDirectory
+from zExceptions import NotFound
+from zope.component.hooks import getSite
+
+import base64
+import binascii
+import codecs
+import heapq
+import json
+import mimetypes
+import os
+
+# One item of a resource directory. "object" is what traversing to the
+# name would return, "size" is in bytes and "mtime" a POSIX timestamp;
+# both are None if they are not known.
+DirectoryEntry = namedtuple(
+    "DirectoryEntry", ["name", "object", "isDirectory", "size", "mtime"]
+)
+
+
+def filtered(name):
+    return any(filter.match(name) for filter in FILTERS)
+
+
+def scanDirectory(folder, start=None, accept=None):
+    """Yield a DirectoryEntry for each item of a resource directory.
+
+    Unlike ``listDirectory()`` followed by ``folder[name]``, every item is
+    looked up only once, and the size and modification time are collected
+    on the way, so the caller does not need to stat the item again.
+
+    If "start" is given, only items whose names sort after it are returned.
+    For persistent directories this is a range lookup in the folder's
+    BTree. "accept" is an optional callable taking the name and whether the
+    item is a directory; items it rejects are skipped before their object
+    or metadata is loaded.
+    """
+    if isinstance(folder, FilesystemResourceDirectory):
+        return _scanFilesystem(folder, start, accept)
+    if isinstance(folder, PersistentResourceDirectory):
+        return _scanPersistent(folder, start, accept)
+    return _scanGeneric(folder, start, accept)
+
+
+def _scanFilesystem(folder, start, accept):
+    with os.scandir(folder.directory) as entries:
+        for entry in entries:
+            name = entry.name
+            if filtered(name) or (start is not None and name <= start):
+                continue
+            if entry.is_dir():
+                if accept is not None and not accept(name, True):
+                    continue
+                obj = folder.__class__(entry.path, parent=folder)
+                yield DirectoryEntry(name, obj, True, None, None)
+            elif entry.is_file():
+                if accept is not None and not accept(name, False):
+                    continue
+                stat = entry.stat()
+                obj = FilesystemFile(folder, None, entry.path, name)
+                yield DirectoryEntry(name, obj, False, stat.st_size, stat.st_mtime)
+
+
+def _scanPersistent(folder, start, accept):
+    context = folder.context
+    if aq_parent(context) is None:
+        # Re-supply the acquisition chain of the root resource directory,
+        # like PersistentResourceDirectory.publishTraverse does.
+        site = getSite()
+        if site is not None:
+            context = context.__of__(site)
+    tree = getattr(aq_base(context), "_tree", None)
+    if start is not None and tree is not None:
+        # BTreeFolder2: only visit the keys after start
+        items = (
+            (name, context._getOb(name))
+            for name in tree.keys(min=start, excludemin=True)
+        )
+    else:
+        items = context.objectItems()
+    for name, obj in items:
+        if filtered(name) or (start is not None and name <= start):
+            continue
+        if IObjectManager.providedBy(obj):
+            if accept is None or accept(name, True):
+                yield DirectoryEntry(
+                    name, folder.__class__(obj), True, None, obj._p_mtime
+                )
+        elif isinstance(obj, File):
+            if accept is None or accept(name, False):
+                yield DirectoryEntry(name, obj, False, obj.get_size(), obj._p_mtime)
+
+
+def _scanGeneric(folder, start, accept):
+    try:
+        names = folder.listDirectory()
+    except NotFound:
+        return
+    for name in names:
+        if start is not None and name <= start:
+            continue
+        try:
+            obj = folder[name]
+        except (KeyError, NotFound):
+            continue
+        isDirectory = IResourceDirectory.providedBy(obj)
+        if accept is None or accept(name, isDirectory):
+            yield DirectoryEntry(name, obj, isDirectory, None, None)
+
+
+# MIME types outside text/* that are edited as text
+TEXT_TYPES = frozenset(
+    [
+        "application/javascript",
+        "application/json",
+        "application/xml",
+        "application/x-javascript",
+        "image/svg+xml",
+    ]
+)
+
+
+def isText(name):
+    mimetype = mimetypes.guess_type(name)[0] or ""
+    return mimetype.startswith("text/") or mimetype in TEXT_TYPES
+
+
+def isImage(name):
+    mimetype = mimetypes.guess_type(name)[0] or ""
+    return mimetype.startswith("image/")
+
+
+# Bytes other than these are taken as a sign of binary data
+_textBytes = bytes(range(32, 127)) + b"\t\n\f\r\b\x1b"
+
+
+def isBinary(data):
+    """Guess whether the head of a file is binary data rather than text.
+
+    Data with NUL bytes is binary. Otherwise valid UTF-8 is text, and so is
+    data in another encoding with few bytes outside printable ASCII.
+    """
+    if b"\0" in data:
+        return True
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+    except UnicodeDecodeError:
+        pass
+    else:
+        return False
+    return len(data.translate(None, _textBytes)) > len(data) * 0.3
+
+
+def typeFilter(filterType):
+    """Return an "accept" callable for scanDirectory() implementing the
+    "type" parameter of getFolder, or None if there is nothing to filter.
+
+    "folders" only accepts folders. "images" and "text" accept folders and
+    the files of that MIME class; any other value is taken as a comma
+    separated list of file extensions.
+    """
+    if not filterType:
+        return None
+    if filterType == "folders":
+        return lambda name, isDirectory: isDirectory
+    if filterType == "images":
+        match = isImage
+    elif filterType == "text":
+        match = isText
+    else:
+        extensions = frozenset(
+            ext.strip().lstrip(".").lower() for ext in filterType.split(",")
+        )
+
+        def match(name):
+            return os.path.splitext(name)[1][1:].lower() in extensions
+
+    def accept(name, isDirectory):
+        return isDirectory or match(name)
+
+    return accept
+
+
+# Sort orders for pageDirectory(). Folders always come before files.
+SORT_KEYS = {
+    "name": lambda entry: (not entry.isDirectory, entry.name),
+    "size": lambda entry: (not entry.isDirectory, entry.size or 0, entry.name),
+    "mtime": lambda entry: (not entry.isDirectory, entry.mtime or 0, entry.name),
+}
+
+
+# Types of the parts of the sort keys, to check cursors against
+NUMBER = (int, float)
+SORT_KEY_TYPES = {
+    "name": (bool, str),
+    "size": (bool, NUMBER, str),
+    "mtime": (bool, NUMBER, str),
+}
+
+
+def encodeCursor(sort, key):
+    data = json.dumps([sort] + list(key)).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decodeCursor(cursor, sort):
+    """Return the sort key encoded in a cursor. Raises ValueError if the
+    cursor is invalid or was made for another sort order.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    if not isinstance(data, list) or not data or data[0] != sort:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    key = tuple(data[1:])
+    types = SORT_KEY_TYPES[sort]
+    if len(key) != len(types):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    for value, expected in zip(key, types):
+        # JSON booleans are ints to Python
+        if not isinstance(value, expected) or (
+            isinstance(value, bool) and expected is not bool
+        ):
+            raise ValueError(f"Invalid cursor {cursor!r}")
+    return key
+
+
+def pageDirectory(folder, limit=None, cursor=None, sort="name", accept=None):
+    """Return a list of at most "limit" DirectoryEntry items of a resource
+    directory in the given sort order, starting after the given cursor,
+    and the cursor for the next page (None on the last page).
+
+    Only "limit" entries are held in memory while the directory is
+    scanned. Persistent directories sorted by name are read in key order
+    from the cursor on, and only as far as the page reaches.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Invalid sort order {sort!r}")
+    if limit is not None and limit < 1:
+        raise ValueError(f"Invalid limit {limit!r}")
+    key = SORT_KEYS[sort]
+    after = None if cursor is None else decodeCursor(cursor, sort)
+
+    if limit is None:
+        entries = scanDirectory(folder, accept=accept)
+        if after is not None:
+            entries = (entry for entry in entries if key(entry) > after)
+        return sorted(entries, key=key), None
+
+    if sort == "name" and isinstance(folder, PersistentResourceDirectory):
+        entries = _pageByName(folder, limit + 1, after, accept)
+    else:
+        entries = scanDirectory(folder, accept=accept)
+        if after is not None:
+            entries = (entry for entry in entries if key(entry) > after)
+        entries = heapq.nsmallest(limit + 1, entries, key=key)
+
+    if len(entries) <= limit:
+        return entries, None
+    entries = entries[:limit]
+    return entries, encodeCursor(sort, key(entries[-1]))
+
+
+def _pageByName(folder, count, after, accept):
+    # The items of a persistent directory come in name order, so folders
+    # and then files can be read from the cursor on without sorting.
+    isFile, start = after if after is not None else (False, None)
+    phases = [(True, start), (False, None)] if not isFile else [(False, start)]
+    result = []
+    for directories, start in phases:
+
+        def acceptPhase(name, isDirectory):
+            if isDirectory != directories:
+                return False
+            return accept is None or accept(name, isDirectory)
+
+        for entry in scanDirectory(folder, start=start, accept=acceptPhase):
+            result.append(entry)
+            if len(result) == count:
+                return result
+    return result
@@ -0,0 +1,198 @@
+"""Full-text search in the text files of a resource directory.
+
+Files are indexed by the trigrams of their lowercased text. A query is
+answered by reading only the files holding all trigrams of the query,
+which are then searched line by line.
+"""
+
+from BTrees.IIBTree import IITreeSet
+from BTrees.IIBTree import intersection
+from BTrees.IOBTree import IOBTree
+from BTrees.OIBTree import OIBTree
+from BTrees.OOBTree import OOBTree
+from OFS.Image import File
+from persistent import Persistent
+from plone.resourceeditor.download import iterFile
+from plone.resourceeditor.scan import isBinary
+
+import os
+import random
+
+# Files larger than this many bytes are not indexed or searched
+SEARCH_MAX_SIZE = 1 << 20
+
+# Maximum number of characters of a matching line returned as snippet
+SNIPPET_SIZE = 200
+
+# File numbers are below this, to fit the 32 bit keys of IOBTree
+MAX_ID = 2**31 - 1
+
+
+def trigrams(text):
+    """Return the set of trigrams of a lowercased text."""
+    return set(map("".join, zip(text, text[1:], text[2:])))
+
+
+def fileText(obj):
+    """Return the text of a file to index, or None if it is binary or too
+    large.
+    """
+    if isinstance(obj, File):
+        size = obj.get_size()
+    else:
+        size = os.path.getsize(obj.path)
+    if size > SEARCH_MAX_SIZE:
+        return None
+    data = b"".join(iterFile(obj))
+    if isBinary(data[:8192]):
+        return None
+    return data.decode("utf-8", "replace")
+
+
+class SearchIndex(Persistent):
+    """An inverted index of the trigrams of the text files of a resource
+    directory.
+
+    Files are numbered: ``ids`` and ``paths`` map paths to numbers and
+    back. Numbers are drawn at random and then counted up per process,
+    like the record ids of a ZCatalog, so that transactions indexing new
+    files concurrently do not write the same counter and conflict. ``grams`` maps trigrams to the set of numbers of the files
+    holding them, and ``files`` maps numbers to the trigrams of the file,
+    so that a file can be reindexed by only touching the trigrams that
+    changed.
+    """
+
+    def __init__(self):
+        self.ids = OIBTree()
+        self.paths = IOBTree()
+        self.grams = OOBTree()
+        self.files = IOBTree()
+
+    @classmethod
+    def build(cls, texts):
+        """Return an index of the given (path, text) pairs. Faster than
+        indexing the files one by one, since every set of numbers is made
+        in one go.
+        """
+        index = cls()
+        postings = {}
+        for path, text in texts:
+            if text is None:
+                continue
+            docid = index._newId(path)
+            grams = trigrams(text.lower())
+            index.files[docid] = tuple(sorted(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(docid)
+        for gram, docids in postings.items():
+            index.grams[gram] = IITreeSet(docids)
+        return index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def index(self, path, text):
+        """Index the text of a file, or unindex the file if it is None."""
+        if text is None:
+            self.unindex(path)
+            return
+        docid = self.ids.get(path)
+        if docid is None:
+            docid = self._newId(path)
+        new = trigrams(text.lower())
+        old = set(self.files.get(docid, ()))
+        for gram in old - new:
+            self._remove(gram, docid)
+        for gram in new - old:
+            docids = self.grams.get(gram)
+            if docids is None:
+                docids = self.grams[gram] = IITreeSet()
+            docids.insert(docid)
+        self.files[docid] = tuple(sorted(new))
+
+    def unindex(self, path):
+        docid = self.ids.get(path)
+        if docid is None:
+            return
+        for gram in self.files.get(docid, ()):
+            self._remove(gram, docid)
+        del self.files[docid]
+        del self.paths[docid]
+        del self.ids[path]
+
+    def subtree(self, path):
+        """Return the paths of the indexed files at or below a path."""
+        paths = list(self.ids.keys(min=path + "/", max=path + "0", excludemax=True))
+        if path in self.ids:
+            paths.append(path)
+        return paths
+
+    def rename(self, path, newPath):
+        """Move the files at or below a path to a new path. Their numbers
+        stay the same, so the trigrams are not touched.
+        """
+        for old in self.subtree(path):
+            new = newPath + old[len(path) :]
+            docid = self.ids[old]
+            del self.ids[old]
+            self.ids[new] = docid
+            self.paths[docid] = new
+
+    def candidates(self, query, prefix=""):
+        """Return the sorted paths of the files that may contain the query,
+        below the given path prefix.
+        """
+        grams = trigrams(query.lower())
+        if not grams:
+            if prefix:
+                return sorted(self.subtree(prefix.rstrip("/")))
+            return list(self.ids.keys())
+        sets = []
+        for gram in grams:
+            docids = self.grams.get(gram)
+            if docids is None:
+                return []
+            sets.append(docids)
+        result = None
+        for docids in sorted(sets, key=len):
+            result = docids if result is None else intersection(result, docids)
+            if not result:
+                return []
+        paths = (self.paths[docid] for docid in result)
+        return sorted(path for path in paths if path.startswith(prefix))
+
+    _v_nextId = None
+
+    def _newId(self, path):
+        docid = self._v_nextId
+        while docid is None or docid in self.paths:
+            docid = random.randrange(MAX_ID)
+        self._v_nextId = docid + 1 if docid + 1 < MAX_ID else None
+        self.ids[path] = docid
+        self.paths[docid] = path
+        return docid
+
+    def _remove(self, gram, docid):
+        docids = self.grams.get(gram)
+        if docids is None:
+            return
+        docids.remove(docid)
+        if not docids:
+            del self.grams[gram]
+
+
+def searchText(text, query, limit=None):
+    """Yield the (line number, snippet) of each line of a text containing
+    the query, ignoring case. Line numbers start at 1.
+    """
+    query = query.lower()
+    count = 0
+    for number, line in enumerate(text.split("\n"), 1):
+        position = line.lower().find(query)
+        if position < 0:
+            continue
+        start = max(0, min(position - SNIPPET_SIZE // 4, len(line) - SNIPPET_SIZE))
+        yield number, line[start : start + SNIPPET_SIZE].strip()
+        count += 1
+        if limit is not None and count >= limit:
+            return
@@ -0,0 +1,411 @@
+from Acquisition import aq_base
+from Acquisition import aq_inner
+from Acquisition import aq_parent
+from BTrees.IOBTree import IOBTree
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from plone.resource.interfaces import IPloneResourceCreatedEvent
+from plone.resource.interfaces import IWritableResourceDirectory
+from plone.resourceeditor.patch import fileHash
+from plone.resourceeditor.scan import scanDirectory
+from plone.resourceeditor.search import fileText
+from plone.resourceeditor.search import SearchIndex
+from ZODB.POSException import ConflictError
+from zope.cachedescriptors import property as zproperty
+
+import uuid
+
+# Name of the attribute holding the state on the folder that backs a
+# persistent resource directory.
+STATE_ATTRIBUTE = "_plone_resourceeditor_state"
+
+# Number of versions whose changes are kept in the journal, at least
+JOURNAL_SIZE = 1000
+
+# Number of versions whose changes are kept in one page of the journal
+JOURNAL_PAGE_SIZE = 50
+
+
+class JournalHead(Persistent):
+    """The latest page of the journal of a resource directory: the changes
+    of the versions after ``start``, in order.
+
+    Transactions appending to the head concurrently are resolved by
+    appending their changes in commit order, like ``BTrees.Length``
+    resolves their version bumps, so each change keeps the version it is
+    numbered with. Only concurrent sealing of the head (see
+    recordChanges()) conflicts.
+    """
+
+    def __init__(self, start=0):
+        self.start = start
+        self.entries = ()
+
+    def _p_resolveConflict(self, old, committed, new):
+        start, entries = old["start"], old["entries"]
+        if new["start"] != start or new["entries"][: len(entries)] != entries:
+            # This transaction sealed the head, so the changes committed
+            # meanwhile would not be in the sealed page
+            raise ConflictError
+        if committed["start"] not in (start, start + len(entries)):
+            raise ConflictError
+        resolved = dict(committed)
+        resolved["entries"] = committed["entries"] + new["entries"][len(entries) :]
+        return resolved
+
+
+class HashEntry(Persistent):
+    """An entry of the hash index: the content hash and size of a file,
+    and the serial of the version of the file it was taken from.
+
+    Entries made when a file is written are committed along with it, so
+    they leave ``serial`` unset and stand for the version committed with
+    their own record. Entries made by rebuildHashIndex() store the serial
+    and modification time of the file.
+    """
+
+    serial = None
+    _mtime = None
+
+    def __init__(self, digest, size, serial=None, mtime=None):
+        self.digest = digest
+        self.size = size
+        self.serial = serial
+        self._mtime = mtime
+
+    @property
+    def mtime(self):
+        """The modification time of the file, or None until committed."""
+        if self._mtime is not None:
+            return self._mtime
+        return self._p_mtime
+
+    def matches(self, obj):
+        """Tell whether the entry was taken from the current version of a
+        persistent file.
+        """
+        if self.size != obj.get_size():
+            return False
+        serial = self._p_serial if self.serial is None else self.serial
+        return serial == obj._p_serial
+
+
+class ResourceDirectoryState(Persistent):
+    """Bookkeeping the resource editor keeps for a persistent resource
+    directory.
+
+    The version is a ``BTrees.Length.Length``, so concurrent bumps from
+    different transactions are resolved instead of raising ConflictError.
+
+    The journal holds the changes of the tree that led to each version, see
+    recordChanges(). New changes are appended to ``head``, a JournalHead,
+    so that concurrent changes do not conflict. Full pages are moved to
+    ``pages``, which maps the version before the first change of a page to
+    its changes.
+
+    The hash index, ``hashes``, maps the paths of the files in the
+    directory, without a leading slash, to HashEntry objects.
+    It is built by rebuildHashIndex(), on request, and then kept up to date
+    with the journal, see updateHashes(). Likewise, ``search`` is the
+    SearchIndex of its text files, built by rebuildSearchIndex().
+    """
+
+    head = None
+    pages = None
+    hashes = None
+    search = None
+
+    def __init__(self):
+        self.key = uuid.uuid4().hex[:8]
+        self.version = Length()
+        self.head = JournalHead()
+        self.pages = IOBTree()
+
+
+def getContainer(resourceDirectory):
+    """Return the persistent folder backing a resource directory, or None
+    for directories that are not stored in the ZODB.
+    """
+    if not IWritableResourceDirectory.providedBy(resourceDirectory):
+        return None
+    return getattr(resourceDirectory, "context", None)
+
+
+def getState(resourceDirectory, create=False):
+    """Return the state of the given resource directory.
+
+    Reading never creates the state, so that views answering GET requests
+    do not write to the database. Returns None if there is no state (yet).
+    """
+    container = getContainer(resourceDirectory)
+    if container is None:
+        return None
+    state = getattr(aq_base(container), STATE_ATTRIBUTE, None)
+    if state is None and create:
+        state = ResourceDirectoryState()
+        setattr(aq_base(container), STATE_ATTRIBUTE, state)
+    return state
+
+
+def getVersionToken(resourceDirectory):
+    """Return an opaque token identifying the current version of the
+    resource directory, or None if the version is not tracked.
+    """
+    state = getState(resourceDirectory)
+    if state is None:
+        return None
+    return f"{state.key}-{state.version()}"
+
+
+def getChanges(resourceDirectory, token):
+    """Return the list of changes since the version identified by "token"
+    (see getVersionToken()), or None if they are not known, e.g. because
+    the version is older than the journal.
+    """
+    state = getState(resourceDirectory)
+    if state is None or state.head is None or not token:
+        return None
+    key, _, version = token.partition("-")
+    try:
+        version = int(version)
+    except ValueError:
+        return None
+    start = state.pages.minKey() if state.pages else state.head.start
+    if key != state.key or not start <= version <= state.version():
+        return None
+    pages = list(state.pages.items())
+    pages.append((state.head.start, state.head.entries))
+    changes = []
+    for start, entries in pages:
+        for entry in entries[max(0, version - start) :]:
+            changes.extend(entry)
+    return changes
+
+
+def recordChanges(state, changes, file=None):
+    """Bump the version of a state and journal the changes leading to it.
+
+    Changes are tuples of an operation and paths relative to the directory,
+    starting with a slash: ("add", path), ("modify", path), ("remove",
+    path) or ("rename", oldPath, newPath). "file" is the IndexedFile of a
+    file added or modified, for the indexes of the state.
+    """
+    updateHashes(state, changes, file)
+    updateSearchIndex(state, changes, file)
+    if state.head is None:
+        # A state from before this journal existed
+        state.head = JournalHead(state.version())
+        state.pages = IOBTree()
+    head = state.head
+    if len(head.entries) >= JOURNAL_PAGE_SIZE:
+        sealPage(state)
+    state.version.change(1)
+    head.entries += (tuple(changes),)
+
+
+def sealPage(state):
+    """Move the full head of the journal to its pages and drop the pages
+    that are no longer needed to cover JOURNAL_SIZE versions. This is the
+    only write to the journal that conflicts with a concurrent one, and
+    happens once every JOURNAL_PAGE_SIZE versions.
+    """
+    head = state.head
+    state.pages[head.start] = head.entries
+    head.start += len(head.entries)
+    head.entries = ()
+    oldest = head.start - JOURNAL_SIZE
+    for key in list(state.pages.keys()):
+        if key + len(state.pages[key]) > oldest:
+            break
+        del state.pages[key]
+
+
+def _subtree(hashes, path):
+    """Return the keys of the hash index at or below a path."""
+    keys = list(hashes.keys(min=path + "/", max=path + "0", excludemax=True))
+    if path in hashes:
+        keys.append(path)
+    return keys
+
+
+class IndexedFile:
+    """A file added or modified, with what the indexes take from it
+    computed on first use, so that it is done once for all states.
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    @zproperty.Lazy
+    def hashEntry(self):
+        return hashEntry(self.obj)
+
+    @zproperty.Lazy
+    def text(self):
+        return fileText(self.obj)
+
+
+def updateHashes(state, changes, file=None):
+    """Apply changes (see recordChanges()) to the hash index of a state,
+    if it has one. "file" is the IndexedFile of "add" and "modify"
+    changes; they are ignored without it, as they are for folders.
+    """
+    hashes = state.hashes
+    if hashes is None:
+        return
+    for change in changes:
+        operation, path = change[0], change[1].lstrip("/")
+        if operation in ("add", "modify"):
+            if file is not None:
+                hashes[path] = file.hashEntry
+        elif operation == "remove":
+            for key in _subtree(hashes, path):
+                del hashes[key]
+        elif operation == "rename":
+            newPath = change[2].lstrip("/")
+            moved = [(key, hashes[key]) for key in _subtree(hashes, path)]
+            for key, value in moved:
+                del hashes[key]
+            for key, value in moved:
+                hashes[newPath + key[len(path) :]] = value
+
+
+def hashEntry(obj):
+    """Return the hash index entry of a persistent file. Files changed in
+    the current transaction have no serial yet, so their entry takes that
+    of the transaction, like those of files being written.
+    """
+    digest, size = fileHash(obj), obj.get_size()
+    if obj._p_changed or obj._p_mtime is None:
+        return HashEntry(digest, size)
+    return HashEntry(digest, size, obj._p_serial, obj._p_mtime)
+
+
+def rebuildHashIndex(resourceDirectory):
+    """Build the hash index of a persistent resource directory from its
+    files, e.g. if it went stale since files were changed without events.
+    Returns the number of files indexed.
+    """
+    state = getState(resourceDirectory, create=True)
+    if state is None:
+        return 0
+    hashes = OOBTree()
+
+    def walk(folder, prefix):
+        for entry in scanDirectory(folder):
+            if entry.isDirectory:
+                walk(entry.object, prefix + entry.name + "/")
+            else:
+                hashes[prefix + entry.name] = hashEntry(entry.object)
+
+    walk(resourceDirectory, "")
+    state.hashes = hashes
+    return len(hashes)
+
+
+def getHash(resourceDirectory, path, obj):
+    """Return the content hash of a file from the hash index, or None if it
+    is not indexed or the entry was taken from another version of the file,
+    e.g. one changed without events.
+    """
+    state = getState(resourceDirectory)
+    if state is None or state.hashes is None:
+        return None
+    entry = state.hashes.get(path.lstrip("/"))
+    if entry is None or not entry.matches(obj):
+        return None
+    return entry.digest
+
+
+def updateSearchIndex(state, changes, file=None):
+    """Apply changes (see recordChanges()) to the search index of a state,
+    if it has one, like updateHashes().
+    """
+    index = state.search
+    if index is None:
+        return
+    for change in changes:
+        operation, path = change[0], change[1].lstrip("/")
+        if operation in ("add", "modify"):
+            if file is not None:
+                index.index(path, file.text)
+        elif operation == "remove":
+            for key in index.subtree(path):
+                index.unindex(key)
+        elif operation == "rename":
+            index.rename(path, change[2].lstrip("/"))
+
+
+def rebuildSearchIndex(resourceDirectory):
+    """Build the search index of a persistent resource directory from its
+    files. Returns the number of text files indexed.
+    """
+    state = getState(resourceDirectory, create=True)
+    if state is None:
+        return 0
+
+    def walk(folder, prefix):
+        for entry in scanDirectory(folder):
+            if entry.isDirectory:
+                yield from walk(entry.object, prefix + entry.name + "/")
+            else:
+                yield prefix + entry.name, fileText(entry.object)
+
+    state.search = SearchIndex.build(walk(resourceDirectory, ""))
+    return len(state.search)
+
+
+def _prefixed(changes, prefix):
+    return [
+        (change[0],) + tuple(prefix + path for path in change[1:]) for change in changes
+    ]
+
+
+def _states(obj):
+    """Yield the states of the folders containing an object, with the path
+    of the object relative to each.
+    """
+    prefix = "/" + obj.getId()
+    parent = aq_parent(aq_inner(obj))
+    while parent is not None:
+        state = getattr(aq_base(parent), STATE_ATTRIBUTE, None)
+        if state is not None:
+            yield state, prefix
+        getId = getattr(aq_base(parent), "getId", None)
+        if getId is None:
+            # The application's request container
+            break
+        prefix = "/" + parent.getId() + prefix
+        parent = aq_parent(aq_inner(parent))
+
+
+def _bumpParents(obj, changes, file=None):
+    for state, prefix in _states(obj):
+        recordChanges(state, _prefixed(changes, prefix), file)
+
+
+def bumpVersion(resourceDirectory, changes=()):
+    """Record a modification of the given resource directory, made by the
+    given changes (see recordChanges()).
+
+    Stateful folders further up are bumped as well, since their trees
+    include the change.
+    """
+    state = getState(resourceDirectory, create=True)
+    if state is None:
+        return
+    recordChanges(state, changes)
+    _bumpParents(getContainer(resourceDirectory), changes)
+
+
+def resourceModified(event):
+    """Bump the versions of the directories containing a file written
+    through ``writeFile``, also when that happens outside the editor
+    (e.g. a theme zip import), journal the change and update the indexes.
+    """
+    if IPloneResourceCreatedEvent.providedBy(event):
+        changes = [("add", "")]
+    else:
+        changes = [("modify", "")]
+    _bumpParents(event.object, changes, IndexedFile(event.object))
@@ -0,0 +1,67 @@
+from types import GeneratorType
+
+import json
+
+_encoder = json.JSONEncoder()
+
+# Number of characters collected before they are written to the response
+CHUNK_SIZE = 1 << 16
+
+
+def iterencode(value):
+    """Encode a value to JSON piece by piece.
+
+    The output is the same as that of ``json.dumps(value)``, but generators
+    are encoded as lists while they are consumed, so a tree whose children
+    are generators never has to be held in memory as a whole.
+    """
+    if isinstance(value, dict):
+        yield "{"
+        first = True
+        for key, item in value.items():
+            if first:
+                first = False
+            else:
+                yield ", "
+            yield _encoder.encode(key)
+            yield ": "
+            yield from iterencode(item)
+        yield "}"
+    elif isinstance(value, (list, tuple, GeneratorType)):
+        yield "["
+        first = True
+        for item in value:
+            if first:
+                first = False
+            else:
+                yield ", "
+            yield from iterencode(item)
+        yield "]"
+    else:
+        yield _encoder.encode(value)
+
+
+def writeJSON(response, value, out=None):
+    """Write the JSON encoding of value to the response in chunks. They
+    are written to "out" instead if given, e.g. a CompressingWriter.
+
+    Only the encoded text is held in memory, not the value. It is not sent
+    to the client early under WSGI though: the publisher buffers what is
+    written to the response until the view returns. Returning an iterator
+    instead does not help, since it is consumed after the ZODB connection
+    of the request is closed, while the value is read from the database.
+    """
+    response.setHeader("Content-Type", "application/json")
+    if out is None:
+        out = response
+    buffer = []
+    size = 0
+    for chunk in iterencode(value):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            out.write("".join(buffer).encode("ascii"))
+            buffer = []
+            size = 0
+    if buffer:
+        out.write("".join(buffer).encode("ascii"))
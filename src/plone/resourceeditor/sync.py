@@ -0,0 +1,81 @@
+"""Synchronization of a resource directory with a manifest of the files it
+should hold, e.g. a theme built by a deployment. The client sends the path,
+size and content hash of each file; only the files that differ are then
+uploaded.
+"""
+
+from plone.resourceeditor.scan import scanDirectory
+
+import json
+
+
+def parseManifest(value, splitPath):
+    """Return a manifest, given as a list of [path, size, hash] entries or
+    its JSON encoding, as a dict mapping paths to (size, hash) tuples.
+    Paths are relative to the synchronized folder; the ones "splitPath"
+    returns None for are left out. Raises ValueError if the manifest is
+    invalid.
+    """
+    if isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    if not isinstance(value, list):
+        raise ValueError(f"Invalid manifest {value!r}")
+    manifest = {}
+    for entry in value:
+        if not isinstance(entry, list) or len(entry) != 3:
+            raise ValueError(f"Invalid manifest entry {entry!r}")
+        path, size, digest = entry
+        if (
+            not isinstance(path, str)
+            or not isinstance(size, int)
+            or not isinstance(digest, str)
+        ):
+            raise ValueError(f"Invalid manifest entry {entry!r}")
+        path = path.strip("/")
+        if splitPath(path) is not None:
+            manifest[path] = (size, digest.lower())
+    return manifest
+
+
+def diffManifest(folder, manifest, hashOf):
+    """Compare a folder of a resource directory with a manifest.
+
+    Returns three sorted lists of paths: the files of the manifest that
+    must be uploaded, the items of the folder that are not in the manifest
+    and must be deleted (whole folders where nothing of the manifest is in
+    them), and the files that already match. Sizes are compared first;
+    "hashOf" is only called, with the path and the file, if they are
+    equal.
+    """
+    folders = set()
+    for path in manifest:
+        names = path.split("/")[:-1]
+        for i in range(len(names)):
+            folders.add("/".join(names[: i + 1]))
+
+    needed = set(manifest)
+    delete = []
+    match = []
+
+    def walk(folder, prefix):
+        for entry in scanDirectory(folder):
+            path = prefix + entry.name
+            if entry.isDirectory:
+                if path in folders:
+                    walk(entry.object, path + "/")
+                else:
+                    delete.append(path)
+                continue
+            expected = manifest.get(path)
+            if expected is None:
+                delete.append(path)
+                continue
+            size, digest = expected
+            if entry.size is not None and entry.size != size:
+                continue
+            if hashOf(path, entry.object) == digest:
+                match.append(path)
+                needed.discard(path)
+
+    walk(folder, "")
+    return sorted(needed), sorted(delete), sorted(match)
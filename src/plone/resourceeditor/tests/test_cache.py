@@ -0,0 +1,76 @@
+from plone.resourceeditor.testing import PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestInfoCache(unittest.TestCase):
+    def test_lru(self):
+        from plone.resourceeditor.cache import InfoCache
+
+        cache = InfoCache(size=2)
+        cache.set("dir", "a", {"path": "/a"})
+        cache.set("dir", "b", {"path": "/b"})
+        self.assertEqual(cache.get("dir", "a"), {"path": "/a"})
+        cache.set("dir", "c", {"path": "/c"})
+
+        self.assertIsNone(cache.get("dir", "b"))
+        self.assertEqual(cache.get("dir", "a"), {"path": "/a"})
+        self.assertEqual(cache.get("dir", "c"), {"path": "/c"})
+
+    def test_invalidate(self):
+        from plone.resourceeditor.cache import InfoCache
+
+        cache = InfoCache()
+        cache.set("dir", "a", {"path": "/a"})
+        cache.set("other", "a", {"path": "/a"})
+        cache.invalidate("dir")
+
+        self.assertIsNone(cache.get("dir", "a"))
+        self.assertEqual(cache.get("other", "a"), {"path": "/a"})
+
+    def test_copies(self):
+        from plone.resourceeditor.cache import InfoCache
+
+        cache = InfoCache()
+        info = {"path": "/a", "properties": {"size": "1kb"}}
+        cache.set("dir", "a", info)
+        info["properties"]["size"] = "2kb"
+        cache.get("dir", "a")["properties"]["size"] = "3kb"
+
+        self.assertEqual(cache.get("dir", "a")["properties"]["size"], "1kb")
+
+
+class TestCachedGetInfo(unittest.TestCase):
+    layer = PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
+
+    def setUp(self):
+        from plone.resourceeditor.cache import infoCache
+
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.addCleanup(infoCache.clear)
+
+    def _write(self, name, data, mtime):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        os.utime(path, (mtime, mtime))
+
+    def test_getfolder_uses_modification_time(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+
+        self._write("test.txt", b"x" * 2048, 1000000000)
+        r = FilesystemResourceDirectory(self.tmp)
+        view = FileManagerActions(r, self.layer["request"])
+
+        info = view.getFolder("/")
+        self.assertEqual(info[0]["properties"]["size"], "2.0kb")
+        self.assertEqual(view.getFolder("/"), info)
+
+        self._write("test.txt", b"x" * 1024, 1000000100)
+        info = view.getFolder("/")
+        self.assertEqual(info[0]["properties"]["size"], "1.0kb")
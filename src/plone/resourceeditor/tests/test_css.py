@@ -0,0 +1,49 @@
+import unittest
+
+BASE = "http://nohost/plone/++theme++mytheme/"
+
+
+class TestRewriteUrls(unittest.TestCase):
+    def test_rewrite(self):
+        from plone.resourceeditor.css import rewriteUrls
+
+        css = (
+            "a { background: url(http://nohost/plone/++theme++mytheme/a.png); }\n"
+            'b { background: url( "http://nohost/plone/++theme++mytheme/img/b.png" ) }\n'
+            "c { background: url('http://nohost/plone/++theme++mytheme/c.svg#icon') }\n"
+            '@import "http://nohost/plone/++theme++mytheme/css/d.css";\n'
+            "@import url(http://nohost/plone/e.css);\n"
+        )
+        self.assertEqual(
+            rewriteUrls(css, BASE),
+            "a { background: url(a.png); }\n"
+            'b { background: url( "img/b.png" ) }\n'
+            "c { background: url('c.svg#icon') }\n"
+            '@import "css/d.css";\n'
+            "@import url(../e.css);\n",
+        )
+
+    def test_leave_others(self):
+        from plone.resourceeditor.css import rewriteUrls
+
+        css = (
+            "a { background: url(http://example.org/a.png); }\n"
+            "b { background: url(img/b.png); }\n"
+            "/* url(http://nohost/plone/++theme++mytheme/c.png) */\n"
+            "d:after { content: 'url(http://nohost/plone/++theme++mytheme/d.png)' }\n"
+            "e { font-family: http; }\n"
+        )
+        self.assertEqual(rewriteUrls(css, BASE), css)
+
+    def test_large_stylesheet(self):
+        from plone.resourceeditor.css import rewriteUrls
+
+        rule = ".icon-%d { background: url(http://nohost/plone/++theme++mytheme/%d.png) }\n"
+        css = "".join(rule % (i, i % 100) for i in range(50000))
+        result = rewriteUrls(css, BASE)
+
+        self.assertEqual(result.count("url("), 50000)
+        self.assertNotIn("http://", result)
+        self.assertEqual(
+            result.splitlines()[1234], ".icon-1234 { background: url(34.png) }"
+        )
@@ -1,5 +1,9 @@
 from plone.resourceeditor.testing import PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
 
+import io
+import json
+import shutil
+import tempfile
 import unittest
 
 
@@ -413,3 +417,375 @@ class TestResourceEditorOperations(unittest.TestCase):
 
         view = FileManager(r, self.layer["request"])
         self.assertEqual(b"foo", view.download("/test.txt"))
+
+    def test_filetree_not_modified(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.writeFile("test.txt", b"foo")
+
+        request = self.layer["request"]
+        view = FileManager(r, request)
+        view.addNew("/", "new.txt")
+        view.filetree()
+        etag = request.response.getHeader("ETag")
+        self.assertTrue(etag)
+        written = request.response.stdout.tell()
+
+        request.environ["HTTP_IF_NONE_MATCH"] = etag
+        self.assertEqual(view.filetree(), "")
+        self.assertEqual(request.response.getStatus(), 304)
+        self.assertEqual(request.response.stdout.tell(), written)
+
+    def test_filetree(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("beta.txt", b"Beta")
+
+        request = self.layer["request"]
+        view = FileManager(r, request)
+        view.filetree()
+        body = request.response.stdout.getvalue().split(b"\r\n\r\n", 1)[1]
+        tree = json.loads(body)
+
+        self.assertEqual(tree[0]["key"], "/")
+        self.assertEqual(tree[0]["children"][0]["key"], "/alpha")
+        self.assertEqual(
+            tree[0]["children"][0]["children"],
+            [{"title": "beta.txt", "key": "/alpha/beta.txt"}],
+        )
+
+    def test_getfolder_modified(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+
+        request = self.layer["request"]
+        view = FileManager(r, request)
+        view.addNew("/alpha", "new.txt")
+        view.mode_selector({"mode": "getfolder", "path": "/alpha"})
+        etag = request.response.getHeader("ETag")
+
+        view.delete("/alpha/new.txt")
+        request.environ["HTTP_IF_NONE_MATCH"] = etag
+        info = json.loads(view.mode_selector({"mode": "getfolder", "path": "/alpha"}))
+        self.assertEqual(info, [])
+        self.assertNotEqual(request.response.getHeader("ETag"), etag)
+
+    def test_getfolder_paged(self):
+        from plone.resourceeditor.browser import FileManager
+        from plone.resourceeditor.scan import encodeCursor
+
+        r = self._make_directory()
+        r.writeFile("beta.txt", b"Beta")
+        r.writeFile("alpha.txt", b"Alpha")
+        r.makeDirectory("delta")
+
+        view = FileManager(r, self.layer["request"])
+        form = {"mode": "getfolder", "path": "/", "limit": "2"}
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual([i["path"] for i in info["items"]], ["/delta", "/alpha.txt"])
+
+        form["cursor"] = info["cursor"]
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual([i["path"] for i in info["items"]], ["/beta.txt"])
+        self.assertIsNone(info["cursor"])
+
+        form["cursor"] = "invalid"
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual(info["code"], 1)
+
+        # A well-formed cursor whose key cannot be compared to those of
+        # the entries is invalid too, rather than a TypeError
+        form["cursor"] = encodeCursor("name", (False, 1))
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual(info["code"], 1)
+
+    def test_getfolder_type(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.writeFile("logo.png", b"")
+        r.writeFile("style.css", b"")
+        r.makeDirectory("delta")
+
+        view = FileManager(r, self.layer["request"])
+        form = {"mode": "getfolder", "path": "/", "type": "images"}
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual([i["path"] for i in info], ["/delta", "/logo.png"])
+
+        form["type"] = "folders"
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual([i["path"] for i in info], ["/delta"])
+
+        form["type"] = "css,js"
+        info = json.loads(view.mode_selector(form))
+        self.assertEqual([i["path"] for i in info], ["/delta", "/style.css"])
+
+    def test_download_range(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.writeFile("test.txt", b"0123456789")
+
+        request = self.layer["request"]
+        request.environ["HTTP_RANGE"] = "bytes=2-5"
+        view = FileManager(r, request)
+
+        self.assertEqual(view.download("/test.txt"), b"2345")
+        self.assertEqual(request.response.getStatus(), 206)
+        self.assertEqual(request.response.getHeader("Content-Range"), "bytes 2-5/10")
+
+        request.environ["HTTP_IF_RANGE"] = "Sat, 01 Jan 2000 00:00:00 GMT"
+        self.assertEqual(view.download("/test.txt"), b"0123456789")
+
+        del request.environ["HTTP_IF_RANGE"]
+        request.environ["HTTP_RANGE"] = "bytes=20-"
+        self.assertEqual(view.download("/test.txt"), b"")
+        self.assertEqual(request.response.getStatus(), 416)
+
+    def test_download_stream(self):
+        from plone.resourceeditor.browser import FileManager
+        from ZPublisher.Iterators import IStreamIterator
+
+        data = bytes(range(256)) * 1024
+        r = self._make_directory()
+        r.writeFile("test.bin", data)
+
+        request = self.layer["request"]
+        view = FileManager(r, request)
+        result = view.download("/test.bin")
+        self.assertTrue(IStreamIterator.providedBy(result))
+        self.assertEqual(len(result), len(data))
+        self.assertEqual(b"".join(result), data)
+
+        request.environ["HTTP_RANGE"] = "bytes=100000-"
+        result = view.download("/test.bin")
+        self.assertEqual(b"".join(result), data[100000:])
+
+    def _use_upload_directory(self):
+        from plone.resourceeditor import upload
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        original = upload.UPLOAD_DIRECTORY
+        upload.UPLOAD_DIRECTORY = tmp
+        self.addCleanup(setattr, upload, "UPLOAD_DIRECTORY", original)
+
+    def test_chunked_upload(self):
+        from plone.resourceeditor.browser import FileManager
+
+        self._use_upload_directory()
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+
+        view = FileManager(r, self.layer["request"])
+        info = view.uploadInit("/alpha", "test.bin", size=6)
+        self.assertEqual(info["code"], 0)
+        self.assertEqual(info["offset"], 0)
+        upload = info["upload"]
+
+        info = view.uploadChunk(upload, 0, io.BytesIO(b"abc"))
+        self.assertEqual(info["offset"], 3)
+
+        # A repeated chunk is refused and the offset to resume from returned
+        info = view.uploadChunk(upload, 0, io.BytesIO(b"abc"))
+        self.assertEqual(info["code"], 1)
+        self.assertEqual(info["offset"], 3)
+        self.assertEqual(view.uploadStatus(upload)["offset"], 3)
+
+        info = view.uploadFinish(upload)
+        self.assertEqual(info["code"], 1)
+        self.assertNotIn("test.bin", r["alpha"])
+
+        view.uploadChunk(upload, 3, b"def")
+        info = view.uploadFinish(upload)
+        self.assertEqual(info["code"], 0)
+        self.assertEqual(info["path"], "/alpha/test.bin")
+        self.assertEqual(r["alpha"].readFile("test.bin"), b"abcdef")
+
+    def test_chunked_upload_exists(self):
+        from plone.protect.authenticator import createToken
+        from plone.resourceeditor.browser import FileManager
+        from zExceptions import BadRequest
+
+        self._use_upload_directory()
+        r = self._make_directory()
+        r.writeFile("test.txt", b"foo")
+
+        view = FileManager(r, self.layer["request"])
+        info = view.uploadInit("/", "test.txt")
+        self.assertEqual(info["code"], 1)
+        self.assertIsNone(info["upload"])
+
+        info = view.uploadInit("/", "ignored", replacepath="/test.txt")
+        self.assertEqual(info["code"], 0)
+        view.uploadChunk(info["upload"], 0, b"bar")
+        view.uploadFinish(info["upload"])
+        self.assertEqual(r.readFile("test.txt"), b"bar")
+
+        self.assertEqual(view.uploadStatus("0" * 32)["code"], 1)
+        self.assertEqual(view.uploadChunk("../test", 0, b"")["code"], 1)
+
+        self.layer["request"].form["_authenticator"] = createToken()
+        form = {"mode": "uploadchunk", "upload": "0" * 32, "chunk": b""}
+        self.assertRaises(BadRequest, view.mode_selector, form)
+        form["offset"] = "start"
+        self.assertRaises(BadRequest, view.mode_selector, form)
+
+    def test_upload_directory(self):
+        from plone.resourceeditor import upload
+
+        import os
+
+        self._use_upload_directory()
+        self.assertEqual(upload.uploadDirectory(), upload.UPLOAD_DIRECTORY)
+
+        # A directory others can write to is not used
+        os.chmod(upload.UPLOAD_DIRECTORY, 0o777)
+        self.assertRaises(PermissionError, upload.startUpload, {})
+
+        # Nor is a symlink, even to a safe directory
+        os.chmod(upload.UPLOAD_DIRECTORY, 0o700)
+        link = upload.UPLOAD_DIRECTORY + "-link"
+        os.symlink(upload.UPLOAD_DIRECTORY, link)
+        self.addCleanup(os.remove, link)
+        upload.UPLOAD_DIRECTORY = link
+        self.assertRaises(PermissionError, upload.startUpload, {})
+
+    def test_savefile_patch(self):
+        from plone.resourceeditor.browser import FileManager
+        from plone.resourceeditor.patch import contentHash
+
+        r = self._make_directory()
+        r.writeFile("test.css", b"a { color: red; }")
+
+        request = self.layer["request"]
+        request.form.update(
+            {
+                "path": "/test.css",
+                "patch": '[[11, 14, "blue"]]',
+                "base": contentHash(b"a { color: red; }"),
+            }
+        )
+        view = FileManager(r, request)
+        view.saveFile("/test.css")
+        self.assertEqual(r.readFile("test.css"), b"a { color: blue; }")
+
+        # The patch was made against the old content
+        view.saveFile("/test.css")
+        self.assertEqual(request.response.getStatus(), 409)
+        self.assertEqual(r.readFile("test.css"), b"a { color: blue; }")
+
+    def test_savefile_unchanged(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.writeFile("test.css", b"body {}")
+
+        view = FileManager(r, self.layer["request"])
+        self.assertEqual(view.saveFile("/test.css", "body {}"), "unchanged")
+        self.assertEqual(view.saveFile("/test.css", "body { }"), " ")
+        self.assertEqual(r.readFile("test.css"), b"body { }")
+
+    def test_savefile_if_match(self):
+        from plone.resourceeditor.browser import FileManager
+        from plone.resourceeditor.patch import contentHash
+
+        r = self._make_directory()
+        r.writeFile("test.css", b"a {}")
+
+        request = self.layer["request"]
+        request.environ["HTTP_IF_MATCH"] = f'"{contentHash(b"b {}")}"'
+        view = FileManager(r, request)
+        view.saveFile("/test.css", "c {}")
+        self.assertEqual(request.response.getStatus(), 412)
+        self.assertEqual(r.readFile("test.css"), b"a {}")
+
+        request.environ["HTTP_IF_MATCH"] = f'"{contentHash(b"a {}")}"'
+        view.saveFile("/test.css", "c {}")
+        self.assertEqual(r.readFile("test.css"), b"c {}")
+
+    def _make_archive(self, entries):
+        import zipfile
+
+        out = io.BytesIO()
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in entries:
+                archive.writestr(name, data)
+        out.seek(0)
+        return out
+
+    def test_import_archive(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("old.css", b"old")
+        r.writeFile("test.txt", b"boo")
+
+        view = FileManager(r, self.layer["request"])
+        large = b"body {}\n" * 100000
+        archive = self._make_archive(
+            [
+                ("alpha/", b""),
+                ("alpha/beta/main.css", large),
+                ("test.txt", b"foo"),
+                (".hidden", b"x"),
+                ("__MACOSX/._test.txt", b"x"),
+            ]
+        )
+        info = view.importArchive("/", archive)
+
+        self.assertEqual(info["code"], 0)
+        self.assertEqual(info["error"], "")
+        self.assertEqual(info["folders"], 2)
+        self.assertEqual(info["files"], 2)
+        self.assertEqual(r.readFile("test.txt"), b"foo")
+        self.assertEqual(r["alpha"]["beta"].readFile("main.css"), large)
+        self.assertEqual(r["alpha"].readFile("old.css"), b"old")
+        self.assertNotIn(".hidden", r)
+        self.assertNotIn("__MACOSX", r)
+
+    def test_import_archive_replace(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("old.css", b"old")
+        r.writeFile("test.txt", b"boo")
+
+        view = FileManager(r, self.layer["request"])
+        archive = self._make_archive([("beta/new.css", b"new")])
+        info = view.importArchive("/alpha", archive, replace=True)
+
+        self.assertEqual(info["code"], 0)
+        self.assertEqual(info["parent"], "/alpha")
+        self.assertEqual(r["alpha"].listDirectory(), ["beta"])
+        self.assertEqual(r["alpha"]["beta"].readFile("new.css"), b"new")
+        self.assertEqual(r.readFile("test.txt"), b"boo")
+
+    def test_import_archive_invalid(self):
+        from plone.resourceeditor.browser import FileManager
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+
+        view = FileManager(r, self.layer["request"])
+
+        for entries in (
+            [("test.txt", b"foo"), ("../evil.txt", b"bar")],
+            [("test.txt", b"foo"), ("/evil.txt", b"bar")],
+            [("test.txt", b"foo"), ("bad:name.txt", b"bar")],
+            [("test.txt", b"foo"), ("alpha", b"bar")],
+        ):
+            info = view.importArchive("/", self._make_archive(entries))
+            self.assertEqual(info["code"], 1)
+            self.assertNotEqual(info["error"], "")
+            self.assertNotIn("test.txt", r)
+
+        info = view.importArchive("/", io.BytesIO(b"not a zip"))
+        self.assertEqual(info["code"], 1)
@@ -1,6 +1,9 @@
 from plone.resourceeditor.testing import PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
 
 import json
+import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -366,3 +369,952 @@ class TestResourceEditorOperations(unittest.TestCase):
 
         view = FileManagerActions(r, self.layer["request"])
         self.assertEqual(b"foo", view.download("/test.txt"))
+
+    def test_datatree(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("beta.txt", b"Beta")
+        r["alpha"].makeDirectory("delta")
+        r["alpha"]["delta"].writeFile("gamma.css", b"body")
+
+        view = FileManagerActions(r, self.layer["request"])
+        tree = view.dataTree()
+
+        self.assertEqual(len(tree), 1)
+        self.assertEqual(tree[0]["path"], "/alpha")
+        children = {c["label"]: c for c in tree[0]["children"]}
+        self.assertEqual(children["beta.txt"]["path"], "/alpha/beta.txt")
+        self.assertEqual(
+            children["delta"]["children"][0]["path"], "/alpha/delta/gamma.css"
+        )
+
+    def test_datatree_depth(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from zExceptions import BadRequest
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("beta.txt", b"Beta")
+        r["alpha"].makeDirectory("delta")
+        r["alpha"]["delta"].writeFile("gamma.css", b"body")
+        r["alpha"].makeDirectory("epsilon")
+
+        view = FileManagerActions(r, self.layer["request"])
+        tree = view.dataTree(depth=1)
+
+        self.assertEqual(len(tree), 1)
+        self.assertNotIn("children", tree[0])
+        self.assertTrue(tree[0]["load_on_demand"])
+
+        tree = view.dataTree("/alpha", depth=1)
+        children = {c["label"]: c for c in tree}
+        self.assertEqual(children["beta.txt"]["path"], "/alpha/beta.txt")
+        self.assertEqual(children["delta"]["path"], "/alpha/delta")
+        self.assertTrue(children["delta"]["load_on_demand"])
+        self.assertFalse(children["epsilon"]["load_on_demand"])
+
+        # The root itself is not a level, so there is no depth below 1
+        self.assertRaises(BadRequest, view.dataTree, depth=0)
+        self.assertRaises(BadRequest, view.compactDataTree, depth=-1)
+        self.layer["request"].form["depth"] = "all"
+        self.assertRaises(BadRequest, view.do_action, "dataTree")
+
+    def test_datatree_invalid_path(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from zExceptions import NotFound
+
+        r = self._make_directory()
+
+        view = FileManagerActions(r, self.layer["request"])
+        self.assertRaises(NotFound, view.dataTree, "/alpha")
+
+    def test_datatree_not_modified(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+
+        request = self.layer["request"]
+        view = FileManagerActions(r, request)
+        view.addFile("/", "test.txt")
+        view.do_action("dataTree")
+        etag = request.response.getHeader("ETag")
+
+        request.environ["HTTP_IF_NONE_MATCH"] = etag
+        self.assertEqual(view.do_action("dataTree"), "")
+        self.assertEqual(request.response.getStatus(), 304)
+
+        # Files written outside of the editor invalidate the version, too
+        r.writeFile("other.txt", b"foo")
+        view.do_action("dataTree")
+        self.assertNotEqual(request.response.getHeader("ETag"), etag)
+
+    def test_datatree_streamed(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("beta.txt", b"Beta")
+        r["alpha"].makeDirectory("delta")
+        r["alpha"]["delta"].writeFile("gamma.css", b"body")
+        r.writeFile("test.txt", b"A text file")
+
+        request = self.layer["request"]
+        view = FileManagerActions(r, request)
+        self.assertEqual(view.do_action("dataTree"), "")
+        body = request.response.stdout.getvalue().split(b"\r\n\r\n", 1)[1]
+
+        self.assertEqual(body, json.dumps(view.dataTree()).encode())
+
+    def test_getfolder_sorted(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("small.txt", b"a")
+        r.writeFile("large.txt", b"a" * 2048)
+        r.makeDirectory("alpha")
+
+        request = self.layer["request"]
+        request.form.update({"action": "getFolder", "path": "/", "sort": "size"})
+        view = FileManagerActions(r, request)
+        info = json.loads(view())
+
+        self.assertEqual(
+            [i["filename"] for i in info], ["alpha", "small.txt", "large.txt"]
+        )
+
+    def test_batch(self):
+        from plone.protect.authenticator import createToken
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("test.txt", b"foo")
+
+        request = self.layer["request"]
+        request.form["_authenticator"] = createToken()
+        request.form["operations"] = json.dumps(
+            [
+                {"action": "addFolder", "path": "/", "name": "alpha"},
+                {"action": "move", "source": "/test.txt", "destination": "/alpha"},
+                {"action": "saveFile", "path": "/alpha/new.css", "data": "body {}"},
+            ]
+        )
+        view = FileManagerActions(r, request)
+        info = json.loads(view.do_action("batch"))
+
+        self.assertEqual(info["code"], 0)
+        self.assertEqual(len(info["results"]), 3)
+        self.assertEqual(info["results"][1]["newPath"], "/alpha/test.txt")
+        self.assertEqual(info["results"][2]["success"], "save")
+        self.assertEqual(r["alpha"].readFile("test.txt"), b"foo")
+        self.assertEqual(r["alpha"].readFile("new.css"), b"body {}")
+
+    def test_batch_rollback(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("test.txt", b"foo")
+
+        view = FileManagerActions(r, self.layer["request"])
+        info = json.loads(
+            view.batch(
+                [
+                    {"action": "addFolder", "path": "/", "name": "alpha"},
+                    {"action": "delete", "path": "/test.txt"},
+                    {"action": "delete", "path": "/missing.txt"},
+                    {"action": "addFile", "path": "/", "filename": "new.txt"},
+                ]
+            )
+        )
+
+        self.assertEqual(info["code"], 1)
+        self.assertNotEqual(info["error"], "")
+        self.assertEqual(len(info["results"]), 3)
+        self.assertNotIn("alpha", r)
+        self.assertNotIn("new.txt", r)
+        self.assertEqual(r.readFile("test.txt"), b"foo")
+
+    def test_batch_unauthorized(self):
+        from AccessControl import Unauthorized
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+
+        request = self.layer["request"]
+        request.form["operations"] = "[]"
+        view = FileManagerActions(r, request)
+        self.assertRaises(Unauthorized, view.do_action, "batch")
+
+    def test_download_filesystem(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with open(os.path.join(tmp, "test.txt"), "wb") as f:
+            f.write(b"0123456789")
+
+        request = self.layer["request"]
+        request.environ["HTTP_RANGE"] = "bytes=-3"
+        view = FileManagerActions(FilesystemResourceDirectory(tmp), request)
+
+        self.assertEqual(b"".join(view.download("/test.txt")), b"789")
+        self.assertEqual(request.response.getHeader("Content-Range"), "bytes 7-9/10")
+
+    def test_download_filesystem_stream(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+        from zExceptions import NotFound
+        from ZPublisher.Iterators import filestream_iterator
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with open(os.path.join(tmp, "test.txt"), "wb") as f:
+            f.write(b"0123456789")
+
+        request = self.layer["request"]
+        view = FileManagerActions(FilesystemResourceDirectory(tmp), request)
+
+        result = view.download("/test.txt")
+        self.addCleanup(result.close)
+        self.assertIsInstance(result, filestream_iterator)
+        self.assertEqual(b"".join(result), b"0123456789")
+        self.assertEqual(request.response.getHeader("Content-Length"), "10")
+        self.assertRaises(NotFound, view.download, "/missing.txt")
+
+    def test_getfile(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("test.css", "body { content: '☃'; }".encode())
+
+        view = FileManagerActions(r, self.layer["request"])
+        result = json.loads(view.getFile("/test.css"))
+
+        self.assertEqual(result["ext"], "css")
+        self.assertEqual(result["contents"], "body { content: '☃'; }")
+        self.assertNotIn("truncated", result)
+
+    def test_getfile_binary(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("font.woff", b"wOFF\x00\x01\x00\x00" + b"\xff" * 100)
+
+        view = FileManagerActions(r, self.layer["request"])
+        result = json.loads(view.getFile("/font.woff"))
+
+        self.assertNotIn("contents", result)
+        self.assertIn("font.woff", result["info"])
+
+    def test_getfile_binary_same_mtime(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        for name, size in (("a.woff", 1024), ("b.woff", 2048)):
+            path = os.path.join(tmp, name)
+            with open(path, "wb") as f:
+                f.write(b"wOFF\x00\x01\x00\x00".ljust(size, b"\xff"))
+            os.utime(path, (1000000000, 1000000000))
+
+        view = FileManagerActions(
+            FilesystemResourceDirectory(tmp), self.layer["request"]
+        )
+        self.assertIn("1.0", json.loads(view.getFile("/a.woff"))["info"])
+        self.assertIn("2.0", json.loads(view.getFile("/b.woff"))["info"])
+
+    def test_getfile_truncated(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("big.js", b"var a = 1;\n" * 100)
+
+        view = FileManagerActions(r, self.layer["request"])
+        view.sniffSize = 16
+        view.maxEditSize = 100
+        result = json.loads(view.getFile("/big.js"))
+
+        self.assertEqual(result["contents"], "var a = 1;\n" * 9)
+        self.assertTrue(result["truncated"])
+        self.assertEqual(result["size"], 1100)
+
+    def test_getfile_filesystem(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with open(os.path.join(tmp, "min.js"), "wb") as f:
+            f.write("é".encode() * 100)
+
+        view = FileManagerActions(
+            FilesystemResourceDirectory(tmp), self.layer["request"]
+        )
+        view.maxEditSize = 51
+        result = json.loads(view.getFile("/min.js"))
+
+        # A character cut in half is dropped
+        self.assertEqual(result["contents"], "é" * 25)
+        self.assertEqual(result["size"], 200)
+
+    def test_getlines(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("test.css", b"a {}\nb {}\nc {}\nd {}\n")
+
+        request = self.layer["request"]
+        request.form.update({"path": "/test.css", "start": "1", "lines": "2"})
+        view = FileManagerActions(r, request)
+        result = json.loads(view.do_action("getFile"))
+
+        self.assertEqual(result["contents"], "b {}\nc {}\n")
+        self.assertEqual(result["start"], 1)
+        self.assertEqual(result["lineCount"], 4)
+        self.assertEqual(result["size"], 20)
+        self.assertNotIn("offsets", result)
+
+        result = json.loads(view.getLines("/test.css", 3, 10, index=True))
+        self.assertEqual(result["contents"], "d {}\n")
+        self.assertEqual(result["offsets"], [0, 5, 10, 15])
+
+        result = json.loads(view.getLines("/test.css", 10, 10))
+        self.assertEqual(result["contents"], "")
+        self.assertEqual(result["start"], 4)
+
+    def test_getlines_cached(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.cache import lineIndexCache
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        with open(os.path.join(tmp, "test.js"), "wb") as f:
+            f.write(b"one\ntwo\nthree")
+
+        view = FileManagerActions(
+            FilesystemResourceDirectory(tmp), self.layer["request"]
+        )
+        result = json.loads(view.getLines("/test.js", 2, 1))
+        self.assertEqual(result["contents"], "three")
+
+        obj = view.getObject("test.js")
+        index = view.getLineIndex("test.js", obj)
+        self.assertEqual(index[0].tolist(), [0, 4, 8])
+        self.assertIs(view.getLineIndex("test.js", obj), index)
+
+        lineIndexCache.invalidate(view.directoryKey)
+        self.assertIsNot(view.getLineIndex("test.js", obj), index)
+
+    def test_getlines_chunks(self):
+        from io import BytesIO
+        from plone.resourceeditor.download import iterFile
+        from plone.resourceeditor.download import lineOffsets
+
+        r = self._make_directory()
+        r.writeFile("big.txt", b"")
+        obj = r["big.txt"]
+        # Uploading to a file with a connection stores its data as a chain
+        # of chunks
+        lines = [b"%09d\n" % i for i in range(20000)]
+        obj.manage_upload(BytesIO(b"".join(lines)))
+
+        chunks = []
+        offsets = lineOffsets(iterFile(obj, chunks=chunks))
+        self.assertEqual(len(chunks), 3)
+
+        # Reading the last line only loads the last chunk
+        connection = obj._p_jar
+        connection.getTransferCounts(True)
+        data = b"".join(iterFile(obj, offsets[-1], obj.get_size(), chunks))
+        self.assertEqual(data, lines[-1])
+        self.assertEqual(connection.getTransferCounts(), (1, 0))
+
+        data = b"".join(iterFile(obj, offsets[6550], offsets[6560], chunks))
+        self.assertEqual(data, b"".join(lines[6550:6560]))
+
+    def test_savefile_patch(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("test.css", b"a { color: red; }\n")
+
+        view = FileManagerActions(r, self.layer["request"])
+        base = json.loads(view.getFile("/test.css"))["hash"]
+
+        result = json.loads(view.saveFile("/test.css", "", [[11, 14, "blue"]], base))
+        self.assertEqual(result["success"], "save")
+        self.assertEqual(r.readFile("test.css"), b"a { color: blue; }")
+
+        # Saves can be chained with the returned hash
+        result = json.loads(
+            view.saveFile("/test.css", "", '[[0, 1, "b"]]', result["hash"])
+        )
+        self.assertEqual(r.readFile("test.css"), b"b { color: blue; }")
+
+        result = json.loads(view.saveFile("/test.css", "", [[0, 1, "c"]], base))
+        self.assertTrue(result["conflict"])
+        self.assertEqual(r.readFile("test.css"), b"b { color: blue; }")
+
+        result = json.loads(
+            view.saveFile("/test.css", "", [[5, 1, "c"]], result.get("hash"))
+        )
+        self.assertEqual(result["code"], 1)
+
+    def test_savefile_unchanged(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.state import getVersionToken
+
+        r = self._make_directory()
+        view = FileManagerActions(r, self.layer["request"])
+        view.saveFile("/test.css", "a { color: red; }\r\n")
+        token = getVersionToken(r)
+        obj = r["test.css"]
+
+        result = json.loads(view.saveFile("/test.css", "a { color: red; }\n"))
+        self.assertTrue(result["unchanged"])
+        self.assertEqual(getVersionToken(r), token)
+        self.assertIs(r["test.css"].aq_base, obj.aq_base)
+
+        result = json.loads(view.saveFile("/test.css", "a { color: blue; }"))
+        self.assertNotIn("unchanged", result)
+        self.assertNotEqual(getVersionToken(r), token)
+
+    def test_savefile_version(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.writeFile("test.css", b"a {}")
+
+        request = self.layer["request"]
+        view = FileManagerActions(r, request)
+        version = json.loads(view.getFile("/test.css"))["hash"]
+        self.assertEqual(request.response.getHeader("ETag"), f'"{version}"')
+
+        result = json.loads(view.saveFile("/test.css", "b {}", version=version))
+        self.assertEqual(result["success"], "save")
+
+        # Another editor still has the old version
+        result = json.loads(view.saveFile("/test.css", "c {}", version=version))
+        self.assertTrue(result["conflict"])
+        self.assertEqual(r.readFile("test.css"), b"b {}")
+
+        request.form.update({"path": "/test.css", "data": "c {}"})
+        request.environ["HTTP_IF_MATCH"] = f'"{version}"'
+        self.assertTrue(json.loads(view.do_action("saveFile"))["conflict"])
+        current = json.loads(view.getFile("/test.css"))["hash"]
+        request.environ["HTTP_IF_MATCH"] = f'"{version}", "{current}"'
+        self.assertEqual(json.loads(view.do_action("saveFile"))["success"], "save")
+        self.assertEqual(r.readFile("test.css"), b"c {}")
+
+        result = json.loads(view.saveFile("/missing.css", "d {}", version="*"))
+        self.assertTrue(result["conflict"])
+
+    def test_datatree_compressed(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.browser import modified
+        from plone.resourceeditor.state import getVersionToken
+
+        import gzip
+
+        r = self._make_directory()
+        for i in range(100):
+            r.writeFile(f"file-{i}.css", b"body")
+        modified(r)
+
+        request = self.layer["request"]
+        request.environ["HTTP_ACCEPT_ENCODING"] = "deflate, gzip;q=0.8"
+        view = FileManagerActions(r, request)
+        self.assertEqual(view.do_action("dataTree"), "")
+        body = request.response.stdout.getvalue().split(b"\r\n\r\n", 1)[1]
+        expected = gzip.decompress(body)
+
+        # The dates of files not committed yet are the current time, so
+        # only the paths are compared with the uncompressed tree
+        self.assertEqual(
+            [item["path"] for item in json.loads(expected)],
+            [item["path"] for item in view.dataTree()],
+        )
+        self.assertEqual(request.response.getHeader("Content-Encoding"), "gzip")
+        self.assertEqual(request.response.getHeader("Vary"), "Accept-Encoding")
+        # The identity and gzip bodies are the same content, not the same
+        # bytes, so they share a weak ETag
+        etag = request.response.getHeader("ETag")
+        self.assertEqual(etag, f'W/"{getVersionToken(r)}"')
+        self.assertFalse(view.treeChanges(etag)["full"])
+
+        # The compressed tree is reused while the directory is unchanged
+        self.assertEqual(gzip.decompress(view.do_action("dataTree")), expected)
+
+        # but not for another language, since file info is translated
+        request["LANGUAGE"] = "de"
+        self.assertEqual(view.do_action("dataTree"), "")
+
+    def test_getfile_compressed(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.browser import isStale
+
+        import gzip
+
+        r = self._make_directory()
+        r.writeFile("small.css", b"a {}")
+        r.writeFile("large.css", b"a {}\n" * 1000)
+
+        request = self.layer["request"]
+        request.environ["HTTP_ACCEPT_ENCODING"] = "gzip"
+        request.form["path"] = "/small.css"
+        view = FileManagerActions(r, request)
+        self.assertEqual(json.loads(view.do_action("getFile"))["contents"], "a {}")
+        self.assertIsNone(request.response.getHeader("Content-Encoding"))
+
+        request.form["path"] = "/large.css"
+        result = json.loads(gzip.decompress(view.do_action("getFile")))
+        self.assertEqual(result["contents"], "a {}\n" * 1000)
+        etag = request.response.getHeader("ETag")
+        self.assertEqual(etag, f'W/"{result["hash"]}"')
+        # The weak ETag still names the version for saves
+        self.assertFalse(isStale(r, "large.css", etag))
+
+        request.environ["HTTP_ACCEPT_ENCODING"] = "gzip;q=0, identity"
+        result = json.loads(FileManagerActions(r, request).do_action("getFile"))
+        self.assertEqual(result["contents"], "a {}\n" * 1000)
+
+    def test_datatree_compact(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("beta.txt", b"Beta")
+        r["alpha"].makeDirectory("delta")
+        r["alpha"]["delta"].writeFile("gamma.css", b"body")
+        r.makeDirectory("empty")
+        r.writeFile("test.txt", b"A text file")
+
+        request = self.layer["request"]
+        request.form["format"] = "compact"
+        view = FileManagerActions(r, request)
+        tree = json.loads(view.do_action("dataTree"))
+
+        self.assertEqual(tree["root"], "")
+        self.assertEqual(
+            list(zip(tree["names"], tree["parents"], tree["types"], tree["sizes"])),
+            [
+                ("alpha", -1, 1, None),
+                ("empty", -1, 1, None),
+                ("test.txt", -1, 0, 11),
+                ("beta.txt", 0, 0, 4),
+                ("delta", 0, 1, None),
+                ("gamma.css", 4, 0, 4),
+            ],
+        )
+        self.assertEqual(len(tree["mtimes"]), 6)
+
+        tree = view.compactDataTree("/alpha", depth=1)
+        self.assertEqual(tree["root"], "/alpha")
+        self.assertEqual(tree["names"], ["beta.txt", "delta"])
+        self.assertEqual(tree["types"], [0, 2])
+
+    def test_tree_changes(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.browser import modified
+        from plone.resourceeditor.state import getState
+        from plone.resourceeditor.state import getVersionToken
+
+        r = self._make_directory()
+        r.writeFile("old.css", b"a {}")
+        modified(r)
+        since = getVersionToken(r)
+
+        view = FileManagerActions(r, self.layer["request"])
+        view.addFolder("/", "alpha")
+        view.saveFile("/alpha/beta.css", "b {}")
+        view.saveFile("/alpha/beta.css", "c {}")
+        view.renameFile("/old.css", "new.css")
+        view.delete("/new.css")
+
+        result = view.treeChanges(since)
+        self.assertFalse(result["full"])
+        self.assertEqual(result["version"], getVersionToken(r))
+        changes = result["changes"]
+        self.assertEqual(
+            [change[:2] for change in changes],
+            [
+                ["add", "/alpha"],
+                ["add", "/alpha/beta.css"],
+                ["rename", "/old.css"],
+                ["remove", "/new.css"],
+            ],
+        )
+        self.assertEqual(changes[2][2], "/new.css")
+        self.assertTrue(changes[0][2]["folder"])
+        self.assertEqual(changes[1][2]["filename"], "beta.css")
+
+        self.assertEqual(view.treeChanges(result["version"])["changes"], [])
+
+        # A save is one version, journaled by the event subscriber
+        version = getState(r).version()
+        view.saveFile("/alpha/beta.css", "d {}")
+        self.assertEqual(getState(r).version(), version + 1)
+
+        # Folders a save creates on the way are journaled before the file
+        since = getVersionToken(r)
+        view.saveFile("/gamma/delta/epsilon.css", "e {}")
+        changes = view.treeChanges(since)["changes"]
+        self.assertEqual(
+            [change[:2] for change in changes],
+            [
+                ["add", "/gamma"],
+                ["add", "/gamma/delta"],
+                ["add", "/gamma/delta/epsilon.css"],
+            ],
+        )
+
+        # Items added and renamed later are sent at their path at the time
+        # of the change, so that the rename moves them
+        since = getVersionToken(r)
+        view.addFile("/", "a.css")
+        view.renameFile("/a.css", "b.css")
+        view.saveFile("/alpha/x.css", "x {}")
+        view.renameFile("/alpha", "beta")
+        changes = view.treeChanges(since)["changes"]
+        self.assertEqual(
+            [change[:2] for change in changes],
+            [
+                ["add", "/a.css"],
+                ["rename", "/a.css"],
+                ["add", "/alpha/x.css"],
+                ["rename", "/alpha"],
+            ],
+        )
+        self.assertEqual(changes[0][2]["filename"], "a.css")
+        self.assertEqual(changes[1][2], "/b.css")
+        self.assertEqual(changes[2][2]["filename"], "x.css")
+        self.assertEqual(changes[3][2], "/beta")
+
+        result = view.treeChanges("unknown-1")
+        self.assertTrue(result["full"])
+        self.assertEqual(result["tree"], view.dataTree())
+
+    def test_tree_changes_journal_size(self):
+        from plone.resourceeditor.browser import modified
+        from plone.resourceeditor.state import getChanges
+        from plone.resourceeditor.state import getState
+        from plone.resourceeditor.state import getVersionToken
+        from unittest import mock
+
+        r = self._make_directory()
+        modified(r)
+        since = getVersionToken(r)
+        with mock.patch.multiple(
+            "plone.resourceeditor.state", JOURNAL_SIZE=3, JOURNAL_PAGE_SIZE=2
+        ):
+            for i in range(8):
+                modified(r, ("add", f"/{i}"))
+                if i == 4:
+                    recent = getVersionToken(r)
+
+        # Full pages are dropped once they are older than JOURNAL_SIZE
+        self.assertEqual(list(getState(r).pages.keys()), [2, 4])
+        self.assertIsNone(getChanges(r, since))
+        self.assertEqual(
+            getChanges(r, recent), [("add", "/5"), ("add", "/6"), ("add", "/7")]
+        )
+
+    def test_export_archive(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        import io
+        import zipfile
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("beta.css", b"body {}" * 20000)
+        r.writeFile("test.txt", b"A text file")
+
+        request = self.layer["request"]
+        request.form.update({"action": "exportArchive", "compression": "stored"})
+        view = FileManagerActions(r, request)
+        result = view()
+        data = b"".join(result)
+
+        self.assertEqual(request.response.getHeader("Content-Type"), "application/zip")
+        self.assertEqual(request.response.getHeader("Content-Length"), str(len(data)))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(
+                archive.namelist(), ["alpha/", "alpha/beta.css", "test.txt"]
+            )
+            self.assertEqual(archive.read("alpha/beta.css"), b"body {}" * 20000)
+            self.assertEqual(
+                archive.getinfo("test.txt").compress_type, zipfile.ZIP_STORED
+            )
+
+        data = b"".join(view.exportArchive("/alpha"))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            self.assertEqual(archive.namelist(), ["beta.css"])
+            self.assertEqual(
+                archive.getinfo("beta.css").compress_type, zipfile.ZIP_DEFLATED
+            )
+
+    def test_export_archive_filesystem(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resourceeditor.browser import FileManagerActions
+        from zExceptions import BadRequest
+        from ZPublisher.Iterators import IUnboundStreamIterator
+
+        import io
+        import zipfile
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        os.mkdir(os.path.join(tmp, "css"))
+        with open(os.path.join(tmp, "css", "main.css"), "wb") as f:
+            f.write(b"body {}")
+
+        view = FileManagerActions(
+            FilesystemResourceDirectory(tmp), self.layer["request"]
+        )
+        result = view.exportArchive()
+        self.assertTrue(IUnboundStreamIterator.providedBy(result))
+        with zipfile.ZipFile(io.BytesIO(b"".join(result))) as archive:
+            self.assertEqual(archive.read("css/main.css"), b"body {}")
+
+        self.assertRaises(BadRequest, view.exportArchive, "", "bzip2")
+
+    def test_sync(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.patch import contentHash
+
+        import io
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+        r["alpha"].writeFile("same.css", b"a {}")
+        r["alpha"].writeFile("changed.css", b"b {}")
+        r["alpha"].writeFile("resized.css", b"c {}")
+        r.makeDirectory("old")
+        r["old"].writeFile("gone.css", b"d {}")
+        r.writeFile("gone.txt", b"e")
+        r.writeFile("beta", b"in the way")
+
+        files = {
+            "alpha/same.css": b"a {}",
+            "alpha/changed.css": b"x {}",
+            "alpha/resized.css": b"c { color: red }",
+            "beta/new.css": b"f {}",
+        }
+        manifest = json.dumps(
+            [[path, len(data), contentHash(data)] for path, data in files.items()]
+            + [[".hidden", 1, contentHash(b"x")]]
+        )
+
+        view = FileManagerActions(r, self.layer["request"])
+        result = view.syncManifest("/", manifest)
+        self.assertEqual(result["code"], 0)
+        self.assertEqual(
+            result["needed"],
+            ["alpha/changed.css", "alpha/resized.css", "beta/new.css"],
+        )
+        self.assertEqual(result["delete"], ["beta", "gone.txt", "old"])
+        self.assertEqual(result["match"], ["alpha/same.css"])
+
+        # Uploads must be complete and match the manifest
+        uploads = {"alpha/changed.css": io.BytesIO(b"x {}")}
+        result = view.syncFiles("/", manifest, uploads)
+        self.assertEqual(result["code"], 1)
+        self.assertEqual(result["missing"], ["alpha/resized.css", "beta/new.css"])
+        uploads.update(
+            {
+                "alpha/resized.css": io.BytesIO(b"c { color: blue }"),
+                "beta/new.css": io.BytesIO(b"f {}"),
+            }
+        )
+        result = view.syncFiles("/", manifest, uploads)
+        self.assertEqual(result["invalid"], ["alpha/resized.css"])
+        self.assertEqual(r["alpha"].readFile("changed.css"), b"b {}")
+
+        uploads["alpha/resized.css"] = io.BytesIO(b"c { color: red }")
+        result = view.syncFiles("/", manifest, uploads)
+        self.assertEqual(result["code"], 0)
+        self.assertEqual(
+            result["written"],
+            ["alpha/changed.css", "alpha/resized.css", "beta/new.css"],
+        )
+        # Only what is in the way is deleted unless asked for
+        self.assertEqual(result["deleted"], ["beta"])
+        self.assertEqual(r["alpha"].readFile("changed.css"), b"x {}")
+        self.assertEqual(r["beta"].readFile("new.css"), b"f {}")
+        self.assertIn("gone.txt", r)
+
+        result = view.syncManifest("/", manifest)
+        self.assertEqual(result["needed"], [])
+        self.assertEqual(len(result["match"]), 4)
+
+        result = view.syncFiles("/", manifest, {}, delete=True)
+        self.assertEqual(result["deleted"], ["gone.txt", "old"])
+        self.assertEqual(sorted(r.listDirectory()), ["alpha", "beta"])
+
+    def test_sync_invalid(self):
+        from plone.resourceeditor.browser import FileManagerActions
+
+        r = self._make_directory()
+        view = FileManagerActions(r, self.layer["request"])
+
+        for manifest in (
+            "not json",
+            json.dumps({"a.css": 1}),
+            json.dumps([["a.css", "1", "abc"]]),
+            json.dumps([["../a.css", 1, "abc"]]),
+        ):
+            self.assertEqual(view.syncManifest("/", manifest)["code"], 1)
+        self.assertEqual(view.syncManifest("/missing", "[]")["code"], 1)
+
+    def test_sync_files_action(self):
+        from plone.protect.authenticator import createToken
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.patch import contentHash
+
+        r = self._make_directory()
+        r.makeDirectory("alpha")
+
+        request = self.layer["request"]
+        request.form.update(
+            {
+                "_authenticator": createToken(),
+                "path": "/alpha",
+                "manifest": json.dumps([["css/main.css", 3, contentHash(b"foo")]]),
+                "file/css/main.css": "foo",
+            }
+        )
+        view = FileManagerActions(r, request)
+        info = json.loads(view.do_action("syncFiles"))
+
+        self.assertEqual(info["code"], 0)
+        self.assertEqual(info["written"], ["css/main.css"])
+        self.assertEqual(r["alpha"]["css"].readFile("main.css"), b"foo")
+
+    def test_hash_index(self):
+        from plone.resourceeditor.browser import FileManager
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.patch import contentHash
+        from plone.resourceeditor.state import getState
+
+        r = self._make_directory()
+        r.writeFile("test.txt", b"foo")
+
+        view = FileManagerActions(r, self.layer["request"])
+        result = view.hashes()
+        self.assertFalse(result["indexed"])
+        self.assertEqual(result["hashes"]["test.txt"][:2], [contentHash(b"foo"), 3])
+
+        # The index is only built on request
+        view.addFolder("/", "alpha")
+        self.assertIsNone(getState(r).hashes)
+        self.assertEqual(view.rebuildHashes()["files"], 1)
+        hashes = getState(r).hashes
+        self.assertEqual(list(hashes.keys()), ["test.txt"])
+
+        view.saveFile("/alpha/beta.css", "b {}")
+        FileManager(r, self.layer["request"]).addNew("/alpha", "new.css")
+        self.assertEqual(hashes["alpha/beta.css"].digest, contentHash(b"b {}"))
+        self.assertEqual(hashes["alpha/new.css"].size, 0)
+
+        view.renameFile("/alpha", "gamma")
+        view.move("/test.txt", "/gamma")
+        view.delete("/gamma/new.css")
+        self.assertEqual(list(hashes.keys()), ["gamma/beta.css", "gamma/test.txt"])
+
+        result = view.hashes("/gamma")
+        self.assertTrue(result["indexed"])
+        self.assertEqual(sorted(result["hashes"]), ["beta.css", "test.txt"])
+        self.assertEqual(result["hashes"]["test.txt"][0], contentHash(b"foo"))
+
+        # Files changed without events are hashed instead of taken from
+        # their stale entry
+        r["gamma"]["test.txt"].update_data(b"quux")
+        result = view.hashes("/gamma")
+        self.assertEqual(result["hashes"]["test.txt"][:2], [contentHash(b"quux"), 4])
+
+    def test_hash_index_rebuild(self):
+        from plone.protect.authenticator import createToken
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.browser import modified
+        from plone.resourceeditor.patch import contentHash
+        from plone.resourceeditor.state import getState
+        from plone.resourceeditor.state import HashEntry
+        from plone.resourceeditor.state import rebuildHashIndex
+
+        r = self._make_directory()
+        r.writeFile("test.txt", b"foo")
+        modified(r)
+        rebuildHashIndex(r)
+        hashes = getState(r).hashes
+
+        # A change made without events leaves the index stale
+        r.context._delOb("test.txt")
+        hashes["other.txt"] = HashEntry("0" * 64, 1)
+
+        request = self.layer["request"]
+        request.form["_authenticator"] = createToken()
+        view = FileManagerActions(r, request)
+        info = json.loads(view.do_action("rebuildHashes"))
+        self.assertEqual(info["files"], 0)
+        self.assertEqual(len(getState(r).hashes), 0)
+
+        r.writeFile("test.txt", b"bar")
+        self.assertEqual(getState(r).hashes["test.txt"].digest, contentHash(b"bar"))
+
+    def test_search(self):
+        from plone.resourceeditor.browser import FileManagerActions
+        from plone.resourceeditor.browser import modified
+        from plone.resourceeditor.state import getState
+
+        r = self._make_directory()
+        r.makeDirectory("css")
+        r["css"].writeFile("main.css", b".btn-primary { color: red }\n")
+        r.writeFile("index.html", b"<html>\n<a class='BTN-primary'>\n</html>\n")
+        r.writeFile("logo.png", b"\x89PNG\r\n\x1a\n\0\0btn-primary")
+
+        view = FileManagerActions(r, self.layer["request"])
+        result = view.search("btn-primary")
+        self.assertFalse(result["indexed"])
+        self.assertEqual(
+            [(item["path"], item["line"]) for item in result["results"]],
+            [("/css/main.css", 1), ("/index.html", 2)],
+        )
+
+        # Changes do not build the index
+        modified(r)
+        self.assertIsNone(getState(r).search)
+        self.assertEqual(view.rebuildSearchIndex()["files"], 2)
+        index = getState(r).search
+        self.assertEqual(sorted(index.ids), ["css/main.css", "index.html"])
+
+        result = view.search("btn-primary")
+        self.assertTrue(result["indexed"])
+        self.assertEqual(len(result["results"]), 2)
+        self.assertEqual(result["results"][1]["snippet"], "<a class='BTN-primary'>")
+
+        # The index follows saves, renames and deletes
+        view.saveFile("/css/main.css", ".btn-secondary {}")
+        view.renameFile("/css", "styles")
+        view.saveFile("/styles/extra.css", "a.btn-primary {}\nb.btn-primary {}")
+        self.assertEqual(
+            [
+                (item["path"], item["line"])
+                for item in view.search("btn-primary")["results"]
+            ],
+            [("/index.html", 2), ("/styles/extra.css", 1), ("/styles/extra.css", 2)],
+        )
+        self.assertEqual(index.candidates("btn-secondary"), ["styles/main.css"])
+
+        result = view.search("btn-primary", "/styles", limit=1)
+        self.assertEqual(result["results"][0]["path"], "/styles/extra.css")
+        self.assertTrue(result["truncated"])
+
+        view.delete("/styles")
+        self.assertEqual(sorted(index.ids), ["index.html"])
+        self.assertEqual(view.search("btn-secondary")["results"], [])
+        self.assertEqual(view.search("")["code"], 1)
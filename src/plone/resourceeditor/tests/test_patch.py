@@ -0,0 +1,35 @@
+import unittest
+
+
+class TestPatch(unittest.TestCase):
+    def test_apply_patch(self):
+        from plone.resourceeditor.patch import applyPatch
+
+        self.assertEqual(applyPatch("abcdef", []), "abcdef")
+        self.assertEqual(
+            applyPatch("abcdef", [[0, 1, "A"], [2, 2, "-"], [4, 6, ""]]), "Ab-cd"
+        )
+        self.assertEqual(applyPatch("", [[0, 0, "☃"]]), "☃")
+
+    def test_utf16_offsets(self):
+        from plone.resourceeditor.patch import applyPatch
+
+        # Offsets count UTF-16 code units, like those of a JavaScript
+        # editor: the emoji is two of them
+        text = "a\U0001f600b c"
+        self.assertEqual(applyPatch(text, [[4, 5, "_"]]), "a\U0001f600b_c")
+        self.assertEqual(applyPatch(text, [[1, 3, "\U0001f642"]]), "a\U0001f642b c")
+        self.assertRaises(ValueError, applyPatch, text, [[2, 2, "x"]])
+        self.assertRaises(ValueError, applyPatch, text, [[0, 7, "x"]])
+        self.assertRaises(ValueError, applyPatch, text, [[0, 0, "\ud83d"]])
+
+    def test_invalid_patch(self):
+        from plone.resourceeditor.patch import applyPatch
+        from plone.resourceeditor.patch import parsePatch
+
+        self.assertRaises(ValueError, applyPatch, "abc", [[2, 3, "x"], [0, 1, "y"]])
+        self.assertRaises(ValueError, applyPatch, "abc", [[0, 4, "x"]])
+        self.assertRaises(ValueError, applyPatch, "abc", [[0, 1]])
+        self.assertRaises(ValueError, applyPatch, "abc", [["0", 1, "x"]])
+        self.assertRaises(ValueError, parsePatch, "{}")
+        self.assertRaises(ValueError, parsePatch, "[")
@@ -0,0 +1,156 @@
+from plone.resourceeditor.testing import PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestScanDirectory(unittest.TestCase):
+    layer = PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
+
+    def test_persistent(self):
+        from plone.resource.interfaces import IResourceDirectory
+        from plone.resourceeditor.scan import scanDirectory
+        from zope.component import getUtility
+
+        resources = getUtility(IResourceDirectory, name="persistent")
+        resources.makeDirectory("theme/mytheme")
+        r = resources["theme"]["mytheme"]
+        r.makeDirectory("alpha")
+        r.writeFile("test.txt", b"A text file")
+        r.writeFile(".hidden", b"")
+
+        entries = {e.name: e for e in scanDirectory(r)}
+
+        self.assertEqual(sorted(entries), ["alpha", "test.txt"])
+        self.assertTrue(entries["alpha"].isDirectory)
+        self.assertTrue(IResourceDirectory.providedBy(entries["alpha"].object))
+        self.assertFalse(entries["test.txt"].isDirectory)
+        self.assertEqual(entries["test.txt"].size, 11)
+        self.assertEqual(entries["test.txt"].object.data, b"A text file")
+
+    def test_filesystem(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+        from plone.resource.file import FilesystemFile
+        from plone.resourceeditor.scan import scanDirectory
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        os.mkdir(os.path.join(tmp, "alpha"))
+        with open(os.path.join(tmp, "test.txt"), "wb") as f:
+            f.write(b"A text file")
+        open(os.path.join(tmp, ".hidden"), "wb").close()
+
+        r = FilesystemResourceDirectory(tmp)
+        entries = {e.name: e for e in scanDirectory(r)}
+
+        self.assertEqual(sorted(entries), ["alpha", "test.txt"])
+        self.assertTrue(entries["alpha"].isDirectory)
+        self.assertEqual(entries["alpha"].object.directory, os.path.join(tmp, "alpha"))
+        self.assertIsInstance(entries["test.txt"].object, FilesystemFile)
+        self.assertEqual(entries["test.txt"].size, 11)
+        self.assertEqual(
+            entries["test.txt"].mtime, os.stat(os.path.join(tmp, "test.txt")).st_mtime
+        )
+
+
+class TestPageDirectory(unittest.TestCase):
+    layer = PLONE_RESOURCE_EDITOR_INTEGRATION_TESTING
+
+    def _make_directory(self):
+        from plone.resource.interfaces import IResourceDirectory
+        from zope.component import getUtility
+
+        resources = getUtility(IResourceDirectory, name="persistent")
+        resources.makeDirectory("theme/mytheme")
+        return resources["theme"]["mytheme"]
+
+    def _pages(self, folder, limit, sort="name"):
+        from plone.resourceeditor.scan import pageDirectory
+
+        pages = []
+        cursor = None
+        while True:
+            entries, cursor = pageDirectory(folder, limit, cursor, sort)
+            pages.append([entry.name for entry in entries])
+            if cursor is None:
+                return pages
+
+    def test_persistent_by_name(self):
+        r = self._make_directory()
+        for name in ("e.txt", "a.txt", "d.css", "b.txt"):
+            r.writeFile(name, b"")
+        r.makeDirectory("z")
+        r.makeDirectory("c")
+
+        self.assertEqual(
+            self._pages(r, 2),
+            [["c", "z"], ["a.txt", "b.txt"], ["d.css", "e.txt"]],
+        )
+        self.assertEqual(
+            self._pages(r, 4), [["c", "z", "a.txt", "b.txt"], ["d.css", "e.txt"]]
+        )
+
+    def test_filesystem_by_size(self):
+        from plone.resource.directory import FilesystemResourceDirectory
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        for name, size in (("a.txt", 3), ("b.txt", 1), ("c.txt", 2)):
+            with open(os.path.join(tmp, name), "wb") as f:
+                f.write(b"x" * size)
+        os.mkdir(os.path.join(tmp, "d"))
+
+        r = FilesystemResourceDirectory(tmp)
+        self.assertEqual(
+            self._pages(r, 3, "size"), [["d", "b.txt", "c.txt"], ["a.txt"]]
+        )
+
+    def test_invalid(self):
+        from plone.resourceeditor.scan import encodeCursor
+        from plone.resourceeditor.scan import pageDirectory
+
+        r = self._make_directory()
+        self.assertRaises(ValueError, pageDirectory, r, 1, None, "color")
+        self.assertRaises(ValueError, pageDirectory, r, 0)
+        self.assertRaises(ValueError, pageDirectory, r, 1, "not a cursor")
+        cursor = encodeCursor("size", (True, 0, "a"))
+        self.assertRaises(ValueError, pageDirectory, r, 1, cursor, "name")
+        # Keys that could not be compared with those of the entries
+        for key in [(True, "a", "a"), (True, None, "a"), (True, 0), (1, 0, "a")]:
+            cursor = encodeCursor("size", key)
+            self.assertRaises(ValueError, pageDirectory, r, 1, cursor, "size")
+        cursor = encodeCursor("name", (True, ["a"]))
+        self.assertRaises(ValueError, pageDirectory, r, 1, cursor, "name")
+
+
+class TestTypeFilter(unittest.TestCase):
+    def test_type_filter(self):
+        from plone.resourceeditor.scan import typeFilter
+
+        self.assertIsNone(typeFilter(None))
+
+        text = typeFilter("text")
+        self.assertTrue(text("main.css", False))
+        self.assertTrue(text("main.js", False))
+        self.assertTrue(text("lib", True))
+        self.assertFalse(text("logo.png", False))
+
+        extensions = typeFilter("woff, .TTF")
+        self.assertTrue(extensions("font.ttf", False))
+        self.assertTrue(extensions("font.woff", False))
+        self.assertFalse(extensions("font.otf", False))
+
+
+class TestIsBinary(unittest.TestCase):
+    def test_is_binary(self):
+        from plone.resourceeditor.scan import isBinary
+
+        self.assertFalse(isBinary(b"body { color: red; }\n"))
+        self.assertFalse(isBinary("café".encode()))
+        # A multibyte character cut at the end of the sniffed data
+        self.assertFalse(isBinary("café".encode()[:-1]))
+        self.assertFalse(isBinary("café crème".encode("latin-1")))
+        self.assertTrue(isBinary(b"GIF89a\x00\x01"))
+        self.assertTrue(isBinary(bytes(range(128, 256))))
@@ -0,0 +1,88 @@
+import unittest
+
+
+class TestSearchIndex(unittest.TestCase):
+    def test_candidates(self):
+        from plone.resourceeditor.search import SearchIndex
+
+        index = SearchIndex()
+        index.index("a.css", ".Button { color: red }")
+        index.index("b/c.css", ".button-large {}")
+        index.index("b/d.html", "<p>text</p>")
+
+        self.assertEqual(sorted(index.candidates("button")), ["a.css", "b/c.css"])
+        self.assertEqual(index.candidates("button", "b/"), ["b/c.css"])
+        self.assertEqual(index.candidates("missing"), [])
+        self.assertEqual(sorted(index.candidates("p", "b/")), ["b/c.css", "b/d.html"])
+
+        index.index("a.css", ".link {}")
+        self.assertEqual(index.candidates("button"), ["b/c.css"])
+
+        index.rename("b", "e")
+        self.assertEqual(index.candidates("button"), ["e/c.css"])
+        self.assertEqual(sorted(index.ids), ["a.css", "e/c.css", "e/d.html"])
+
+        index.index("e/c.css", None)
+        self.assertEqual(index.candidates("button"), [])
+        self.assertNotIn("utt", index.grams)
+
+    def test_build(self):
+        from plone.resourceeditor.search import SearchIndex
+
+        texts = [("a.css", ".Button {}"), ("b.png", None), ("c/d.css", "button")]
+        index = SearchIndex.build(texts)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.candidates("butt"), ["a.css", "c/d.css"])
+
+        index.index("e.css", "button")
+        index.unindex("a.css")
+        self.assertEqual(index.candidates("butt"), ["c/d.css", "e.css"])
+
+    def test_concurrent_index(self):
+        from plone.resourceeditor.search import SearchIndex
+        from ZODB.DB import DB
+        from ZODB.FileStorage import FileStorage
+
+        import os
+        import shutil
+        import tempfile
+        import transaction
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        db = DB(FileStorage(os.path.join(tmp, "Data.fs")))
+        self.addCleanup(db.close)
+
+        tm1 = transaction.TransactionManager()
+        tm2 = transaction.TransactionManager()
+        conn1 = db.open(tm1)
+        conn2 = db.open(tm2)
+        conn1.root()["index"] = SearchIndex.build([("a.css", ".button {}")])
+        tm1.commit()
+        conn2.sync()
+
+        # Adding new files in two transactions does not conflict
+        conn1.root()["index"].index("b.css", ".button")
+        conn2.root()["index"].index("c.css", "button {}")
+        tm1.commit()
+        tm2.commit()
+
+        conn1.sync()
+        index = conn1.root()["index"]
+        self.assertEqual(index.candidates("button"), ["a.css", "b.css", "c.css"])
+        self.assertEqual(len(set(index.ids.values())), 3)
+
+    def test_search_text(self):
+        from plone.resourceeditor.search import searchText
+
+        text = "one\nTwo two\nthree\n" + "x" * 500 + "two"
+        self.assertEqual([line for line, snippet in searchText(text, "two")], [2, 4])
+        self.assertEqual(list(searchText(text, "two", limit=1)), [(2, "Two two")])
+        snippet = list(searchText(text, "two"))[1][1]
+        self.assertTrue(snippet.endswith("two"))
+        self.assertLessEqual(len(snippet), 200)
+
+        # Lines are numbered like the line index of getFile: only "\n"
+        # ends them
+        text = "a\rb\u2028c\x0cd\r\ntwo"
+        self.assertEqual(list(searchText(text, "two")), [(2, "two")])
@@ -0,0 +1,132 @@
+import unittest
+
+
+class TestJournalHead(unittest.TestCase):
+    def _state(self, start, *entries):
+        return {"start": start, "entries": tuple(entries)}
+
+    def test_resolve_appends(self):
+        from plone.resourceeditor.state import JournalHead
+
+        head = JournalHead()
+        old = self._state(0, "a")
+        resolved = head._p_resolveConflict(
+            old, self._state(0, "a", "b"), self._state(0, "a", "c")
+        )
+        # The changes of the transaction committed first come first
+        self.assertEqual(resolved, self._state(0, "a", "b", "c"))
+
+    def test_resolve_after_seal(self):
+        from plone.resourceeditor.state import JournalHead
+
+        head = JournalHead()
+        old = self._state(0, "a", "b")
+        resolved = head._p_resolveConflict(
+            old, self._state(2, "c"), self._state(0, "a", "b", "d")
+        )
+        self.assertEqual(resolved, self._state(2, "c", "d"))
+
+    def test_concurrent_seal_conflicts(self):
+        from plone.resourceeditor.state import JournalHead
+        from ZODB.POSException import ConflictError
+
+        head = JournalHead()
+        old = self._state(0, "a", "b")
+        self.assertRaises(
+            ConflictError,
+            head._p_resolveConflict,
+            old,
+            self._state(0, "a", "b", "c"),
+            self._state(2, "d"),
+        )
+        self.assertRaises(
+            ConflictError,
+            head._p_resolveConflict,
+            old,
+            self._state(2, "c"),
+            self._state(2, "d"),
+        )
+
+
+class TestConcurrentChanges(unittest.TestCase):
+    def test_concurrent_changes_resolve(self):
+        from plone.resourceeditor.state import getChanges
+        from plone.resourceeditor.state import recordChanges
+        from plone.resourceeditor.state import ResourceDirectoryState
+        from unittest import mock
+        from ZODB.DB import DB
+        from ZODB.FileStorage import FileStorage
+
+        import os
+        import shutil
+        import tempfile
+        import transaction
+
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        db = DB(FileStorage(os.path.join(tmp, "Data.fs")))
+        self.addCleanup(db.close)
+
+        tm1 = transaction.TransactionManager()
+        tm2 = transaction.TransactionManager()
+        conn1 = db.open(tm1)
+        conn2 = db.open(tm2)
+        conn1.root()["state"] = state = ResourceDirectoryState()
+        recordChanges(state, [("add", "/a")])
+        tm1.commit()
+        conn2.sync()
+
+        recordChanges(conn1.root()["state"], [("add", "/b")])
+        recordChanges(conn2.root()["state"], [("add", "/c")])
+        tm1.commit()
+        tm2.commit()
+
+        conn1.sync()
+        state = conn1.root()["state"]
+        self.assertEqual(state.version(), 3)
+
+        class Directory:
+            pass
+
+        directory = Directory()
+        with mock.patch("plone.resourceeditor.state.getState", return_value=state):
+            self.assertEqual(
+                getChanges(directory, f"{state.key}-1"),
+                [("add", "/b"), ("add", "/c")],
+            )
+
+
+class TestHashEntry(unittest.TestCase):
+    def test_matches_version(self):
+        from OFS.Image import File
+        from plone.resourceeditor.patch import contentHash
+        from plone.resourceeditor.state import hashEntry
+        from plone.resourceeditor.state import HashEntry
+        from ZODB.DB import DB
+        from ZODB.MappingStorage import MappingStorage
+
+        import transaction
+
+        db = DB(MappingStorage())
+        self.addCleanup(db.close)
+        tm = transaction.TransactionManager()
+        root = db.open(tm).root()
+
+        # An entry made when the file is written is committed with it
+        root["file"] = obj = File("file", "", b"foo")
+        root["written"] = HashEntry(contentHash(b"foo"), 3)
+        tm.commit()
+        self.assertTrue(root["written"].matches(obj))
+        self.assertEqual(root["written"].mtime, obj._p_mtime)
+
+        root["rebuilt"] = hashEntry(obj)
+        self.assertEqual(root["rebuilt"].serial, obj._p_serial)
+        tm.commit()
+        self.assertTrue(root["rebuilt"].matches(obj))
+
+        # A change of the file without events, even of the same size,
+        # leaves both entries stale
+        obj.update_data(b"bar")
+        tm.commit()
+        self.assertFalse(root["written"].matches(obj))
+        self.assertFalse(root["rebuilt"].matches(obj))
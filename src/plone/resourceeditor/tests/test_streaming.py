@@ -0,0 +1,27 @@
+import json
+import unittest
+
+
+class TestIterencode(unittest.TestCase):
+    def test_same_as_dumps(self):
+        from plone.resourceeditor.streaming import iterencode
+
+        value = [
+            {"label": "caf\xe9", "folder": True, "path": "/a", "children": []},
+            {"size": 1.5, "none": None, "nested": {"list": [1, "two", (3,)]}},
+        ]
+        self.assertEqual("".join(iterencode(value)), json.dumps(value))
+
+    def test_generators(self):
+        from plone.resourceeditor.streaming import iterencode
+
+        def children():
+            yield {"title": "a"}
+            yield {"title": "b", "children": (i for i in range(2))}
+
+        self.assertEqual(
+            "".join(iterencode({"children": children()})),
+            json.dumps(
+                {"children": [{"title": "a"}, {"title": "b", "children": [0, 1]}]}
+            ),
+        )
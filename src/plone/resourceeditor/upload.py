@@ -0,0 +1,142 @@
+"""Staging area for chunked uploads.
+
+Chunks are appended to a spool file in a directory of the instance (below
+its client home, or the temporary directory if it has none), so all
+requests of one upload must reach the same instance (or instances sharing
+the directory). Only the final file is written to the resource directory,
+in one transaction.
+"""
+
+from App.config import getConfiguration
+from plone.resourceeditor.download import CHUNK_SIZE
+
+import json
+import os
+import re
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import uuid
+
+# The staging directory; None for the default, see uploadDirectory()
+UPLOAD_DIRECTORY = None
+
+# Uploads not touched for this many seconds are removed
+UPLOAD_TIMEOUT = 24 * 60 * 60
+
+_uploadId = re.compile(r"[0-9a-f]{32}")
+_lock = threading.Lock()
+
+
+def uploadDirectory():
+    """Return the staging directory, creating it if needed.
+
+    It is only used if it is a directory owned by the user running the
+    instance and closed to others, since the default location may be in
+    a shared temporary directory where another user could have made it
+    first. Raises PermissionError otherwise.
+    """
+    path = UPLOAD_DIRECTORY
+    if path is None:
+        home = getattr(getConfiguration(), "clienthome", None)
+        path = os.path.join(
+            home or tempfile.gettempdir(), "plone.resourceeditor-uploads"
+        )
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or (
+        os.name == "posix" and (info.st_uid != os.getuid() or info.st_mode & 0o077)
+    ):
+        raise PermissionError(f"Unsafe upload directory {path!r}")
+    return path
+
+
+def _paths(uploadId):
+    if not isinstance(uploadId, str) or not _uploadId.fullmatch(uploadId):
+        raise KeyError(uploadId)
+    base = os.path.join(uploadDirectory(), uploadId)
+    return base + ".json", base + ".part"
+
+
+def cleanup(now=None):
+    """Remove the uploads that have not been touched for UPLOAD_TIMEOUT."""
+    if now is None:
+        now = time.time()
+    directory = uploadDirectory()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < now - UPLOAD_TIMEOUT:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def startUpload(metadata):
+    """Create an empty upload with the given metadata and return its id."""
+    cleanup()
+    uploadId = uuid.uuid4().hex
+    metaPath, partPath = _paths(uploadId)
+    with open(partPath, "wb"):
+        pass
+    with open(metaPath, "w") as f:
+        json.dump(metadata, f)
+    return uploadId
+
+
+def getUpload(uploadId):
+    """Return the metadata and the current offset of an upload. Raises
+    KeyError if there is no such upload.
+    """
+    metaPath, partPath = _paths(uploadId)
+    try:
+        with open(metaPath) as f:
+            metadata = json.load(f)
+        offset = os.path.getsize(partPath)
+    except (OSError, ValueError):
+        raise KeyError(uploadId)
+    return metadata, offset
+
+
+def appendChunk(uploadId, offset, data):
+    """Append a chunk to an upload and return the new offset.
+
+    "data" is bytes, text or a file-like object. The chunk is only accepted if
+    "offset" is the current size of the upload; otherwise ValueError is
+    raised and the client should resume from getUpload()'s offset.
+    """
+    metaPath, partPath = _paths(uploadId)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with _lock:
+        try:
+            current = os.path.getsize(partPath)
+        except OSError:
+            raise KeyError(uploadId)
+        if offset != current:
+            raise ValueError(f"Expected offset {current}, got {offset}")
+        with open(partPath, "ab") as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                shutil.copyfileobj(data, f, CHUNK_SIZE)
+            return f.tell()
+
+
+def openUpload(uploadId):
+    """Open the data of an upload for reading."""
+    metaPath, partPath = _paths(uploadId)
+    try:
+        return open(partPath, "rb")
+    except OSError:
+        raise KeyError(uploadId)
+
+
+def removeUpload(uploadId):
+    for path in _paths(uploadId):
+        try:
+            os.remove(path)
+        except OSError:
+            pass